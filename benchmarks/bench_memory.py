@@ -0,0 +1,82 @@
+"""
+Profiles the memory allocated by the session module: the size of session and
+data manager objects and the peak memory allocated by a request loading,
+modifying and storing a session through the context member. The peak memory
+of a request, that does not access its session, is given for reference. Uses
+the same backend stand-ins as bench_sessions.py.
+
+Usage: python benchmarks/bench_memory.py [--requests N]
+"""
+
+import argparse
+import gc
+import sys
+import tracemalloc
+
+from bench_sessions import init_backend, make_data
+from score.session._init import DataManager
+
+
+def object_size(obj):
+    """
+    Returns the size of given object including its attribute dict.
+    """
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def profile(backend, requests):
+    ctx_conf, session_conf = init_backend(backend)
+    with ctx_conf.Context() as ctx:
+        session = session_conf.create(ctx)
+        session.update(make_data(5, 16))
+        session.store()
+        id = session.id
+        manager = DataManager(session_conf, ctx, session)
+        sizes = (object_size(session), object_size(manager))
+    # warm up caches of the backends before tracing
+    for i in range(10):
+        request(ctx_conf, id, i)
+    return sizes + (
+        peak_memory(lambda i: request(ctx_conf, id, i), requests),
+        peak_memory(lambda i: ctx_conf.Context().destroy(), requests))
+
+
+def request(ctx_conf, id, i):
+    with ctx_conf.Context() as ctx:
+        ctx.session_id = id
+        ctx.session['key-0'] = str(i)
+
+
+def peak_memory(operation, repeat):
+    """
+    Returns the maximum amount of memory allocated during a single call of
+    given *operation*.
+    """
+    gc.collect()
+    tracemalloc.start()
+    peak = 0
+    for i in range(repeat):
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        operation(i)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+    return peak
+
+
+def run(requests):
+    print('%-14s %12s %12s %18s %18s' % (
+        'backend', 'session (B)', 'manager (B)', 'request peak (B)',
+        'empty context (B)'))
+    for backend in ('kvcache', 'kvcache-keys', 'orm'):
+        print('%-14s %12d %12d %18d %18d' % (
+            (backend,) + profile(backend, requests)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=1000)
+    run(parser.parse_args().requests)
@@ -0,0 +1,61 @@
+"""
+Compares the cost of reading session values through the default deep-copying
+path with the read-only views of the ``readonly`` mode.
+
+Usage: python benchmarks/bench_readonly.py [--repeat N]
+"""
+
+import argparse
+from copy import deepcopy
+import timeit
+
+from score.session._readonly import freeze
+
+
+def make_cart(items):
+    return {
+        'items': [
+            {
+                'sku': 'SKU-%06d' % i,
+                'quantity': i % 5 + 1,
+                'price': i * 1.5,
+                'tags': ['tag-%d' % t for t in range(5)],
+            }
+            for i in range(items)
+        ],
+        'currency': 'EUR',
+    }
+
+
+def make_permissions(roles):
+    return {
+        'role-%d' % r: {
+            'resource-%d' % i: ['read', 'write'] for i in range(20)
+        }
+        for r in range(roles)
+    }
+
+
+def run(repeat):
+    values = {
+        'small': {'user_id': 42, 'locale': 'de_AT'},
+        'cart-100': make_cart(100),
+        'cart-1000': make_cart(1000),
+        'permissions-50': make_permissions(50),
+    }
+    print('%-16s %14s %14s %10s' % ('value', 'deepcopy (us)', 'freeze (us)',
+                                     'speedup'))
+    for name, value in values.items():
+        copy_time = min(timeit.repeat(
+            lambda: deepcopy(value), number=10, repeat=repeat)) / 10
+        freeze_time = min(timeit.repeat(
+            lambda: freeze(value), number=10, repeat=repeat)) / 10
+        print('%-16s %14.2f %14.2f %9.0fx' % (
+            name, copy_time * 1e6, freeze_time * 1e6,
+            copy_time / freeze_time))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    run(parser.parse_args().repeat)
@@ -0,0 +1,240 @@
+"""
+Measures the latency and throughput of session operations on the kvcache and
+orm backends. External services are replaced by an in-memory kvcache backend,
+that pickles its values like a real cache server would, and an in-memory
+SQLite database.
+
+The results can be written to a JSON file and compared against the results
+of a previous run, in which case the exit status is non-zero if any
+operation got slower by more than the given tolerance.
+
+Usage: python benchmarks/bench_sessions.py [--repeat N] [--output FILE]
+                                           [--baseline FILE] [--tolerance PCT]
+"""
+
+import argparse
+import json
+import pickle
+import platform
+import statistics
+import sys
+import time
+from weakref import WeakKeyDictionary
+
+import score.ctx
+from score.kvcache import CacheContainer, NotFound
+from score.kvcache.backend import Backend
+from sqlalchemy import create_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+from zope.sqlalchemy import register
+
+import score.session
+from score.session.orm import OrmSessionMixin
+
+
+Base = declarative_base()
+
+
+class SessionRow(Base, OrmSessionMixin):
+    __tablename__ = '_session'
+
+
+class MemoryBackend(Backend):
+    """
+    A kvcache backend keeping pickled values in a dict.
+    """
+
+    def __init__(self):
+        self.values = {}
+
+    def store(self, container, key, value, expire=None):
+        self.values[(container, key)] = pickle.dumps(value)
+
+    def retrieve(self, container, key):
+        try:
+            return pickle.loads(self.values[(container, key)])
+        except KeyError:
+            raise NotFound(key)
+
+    def invalidate(self, container, key):
+        self.values.pop((container, key), None)
+
+
+class SqliteOrm:
+    """
+    Stands in for a configured score.sa.orm module, providing one SQLAlchemy
+    session per context.
+    """
+
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.sessionmaker = sessionmaker(bind=self.engine)
+        self.sessions = WeakKeyDictionary()
+
+    def get_session(self, ctx):
+        if ctx not in self.sessions:
+            session = self.sessionmaker()
+            register(session, transaction_manager=self.ctx.get_tx(ctx))
+            self.sessions[ctx] = session
+        return self.sessions[ctx]
+
+
+def init_backend(backend):
+    ctx_conf = score.ctx.init({})
+    conf = {'cookie': 'None'}
+    kwargs = {'ctx': ctx_conf}
+    if backend == 'orm':
+        conf['orm.class'] = __name__ + '.SessionRow'
+        kwargs['orm'] = SqliteOrm(ctx_conf)
+    else:
+        conf['kvcache.layout'] = backend.partition('-')[2] or 'dict'
+        kwargs['kvcache'] = {
+            'score.session': CacheContainer('score.session', MemoryBackend()),
+        }
+    session_conf = score.session.init(conf, **kwargs)
+    # this is usually performed by score.init after initializing all modules
+    ctx_conf._finalize(None)
+    return ctx_conf, session_conf
+
+
+def make_data(keys, value_size):
+    return {'key-%d' % i: 'x' * value_size for i in range(keys)}
+
+
+def measure(operation, repeat, setup=None):
+    """
+    Calls *operation* *repeat* times and returns a list of durations in
+    seconds. The operation receives the number of the iteration, or the
+    return value of the untimed *setup* function, if one is given, which
+    itself receives the number of the iteration.
+    """
+    durations = []
+    for i in range(repeat):
+        arg = i if setup is None else setup(i)
+        start = time.perf_counter()
+        operation(arg)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def summarize(durations):
+    durations = sorted(durations)
+    return {
+        'ops_per_sec': len(durations) / sum(durations),
+        'mean_us': statistics.mean(durations) * 1e6,
+        'p50_us': durations[len(durations) // 2] * 1e6,
+        'p99_us': durations[int(len(durations) * .99)] * 1e6,
+    }
+
+
+def bench_backend(backend, keys, value_size, repeat):
+    ctx_conf, session_conf = init_backend(backend)
+    data = make_data(keys, value_size)
+    results = {}
+    with ctx_conf.Context() as ctx:
+        ids = []
+
+        def create(i):
+            session = session_conf.create(ctx)
+            for key, value in data.items():
+                session[key] = value
+            session.store()
+            ids.append(session.id)
+        results['create'] = measure(create, repeat)
+
+    # the orm backend needs a fresh context to actually hit the database
+    with ctx_conf.Context() as ctx:
+        results['load'] = measure(
+            lambda i: session_conf.load(ids[i], ctx)._prefetch(), repeat)
+
+    with ctx_conf.Context() as ctx:
+        session = session_conf.load(ids[0], ctx)
+        session._prefetch()
+        results['get'] = measure(lambda i: session['key-%d' % (i % keys)],
+                                 repeat)
+
+        def set_(i):
+            session['key-%d' % (i % keys)] = str(i)
+        results['set'] = measure(set_, repeat)
+
+        def modify(i):
+            session['key-0'] = str(i)
+        results['store'] = measure(lambda _: session.store(), repeat, modify)
+
+    def open_context(i):
+        ctx = ctx_conf.Context()
+        ctx.session_id = ids[i]
+        ctx.session['key-0'] = str(i)
+        return ctx
+    # the transaction path: the context member is stored by the data manager
+    # when the context is destroyed
+    results['commit'] = measure(lambda ctx: ctx.destroy(), repeat,
+                                open_context)
+    return {op: summarize(durations) for op, durations in results.items()}
+
+
+def run(repeat):
+    results = {}
+    for backend in ('kvcache', 'kvcache-keys', 'orm'):
+        for keys, value_size in ((5, 16), (50, 16), (5, 4096)):
+            case = '%s/%dx%dB' % (backend, keys, value_size)
+            for op, stats in bench_backend(
+                    backend, keys, value_size, repeat).items():
+                results['%s/%s' % (case, op)] = stats
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Prints the change of the median latency of each operation relative to
+    the *baseline* and returns the names of operations, that got slower by
+    more than *tolerance* percent.
+    """
+    regressions = []
+    for name, stats in sorted(results.items()):
+        if name not in baseline:
+            continue
+        change = (stats['p50_us'] / baseline[name]['p50_us'] - 1) * 100
+        flag = ''
+        if change > tolerance:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print('%-40s %+8.1f%%%s' % (name, change, flag))
+    return regressions
+
+
+def print_results(results):
+    print('%-40s %12s %10s %10s %10s' % (
+        'operation', 'ops/s', 'mean (us)', 'p50 (us)', 'p99 (us)'))
+    for name, stats in sorted(results.items()):
+        print('%-40s %12.0f %10.1f %10.1f %10.1f' % (
+            name, stats['ops_per_sec'], stats['mean_us'], stats['p50_us'],
+            stats['p99_us']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare with this JSON file')
+    parser.add_argument('--tolerance', type=float, default=20,
+                        help='allowed slowdown in percent')
+    args = parser.parse_args()
+    results = run(args.repeat)
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({
+                'python': platform.python_version(),
+                'repeat': args.repeat,
+                'results': results,
+            }, file, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+        print()
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
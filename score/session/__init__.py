@@ -26,8 +26,10 @@
 # the Licensee has his registered seat, an establishment or assets.
 
 from ._init import init, ConfiguredSessionModule, Session
+from ._readonly import FrozenDict, FrozenList
 
 
 __version__ = '0.5.3'
 
-__all__ = ('init', 'ConfiguredSessionModule', 'Session')
+__all__ = ('init', 'ConfiguredSessionModule', 'Session', 'FrozenDict',
+           'FrozenList')
@@ -0,0 +1,174 @@
+# Copyright © 2015-2018 STRG.AT GmbH, Vienna, Austria
+# Copyright © 2019-2020 Necdet Can Ateşman <can@atesman.at>, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in
+# the file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district
+# the Licensee has his registered seat, an establishment or assets.
+
+from collections import OrderedDict
+import pickle
+import threading
+import time
+
+
+class LocalCache:
+    """
+    An in-process LRU cache of session payloads. Every entry carries the
+    revision of the payload, which is compared to the revision in the backend
+    before the entry is used. The comparison is skipped for entries, that
+    were validated less than *staleness* seconds ago.
+
+    The cache holds at most *max_entries* sessions and, if *max_bytes* is
+    given, at most *max_bytes* of pickled payload data.
+    """
+
+    def __init__(self, max_entries, max_bytes=None, staleness=0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.staleness = staleness
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, id, current_revision):
+        """
+        Returns a tuple containing the revision and the cached payload for
+        given session *id*, or `None`, if the session is not cached or the
+        entry is outdated. The callable
+        *current_revision* must return the revision currently stored in the
+        backend. It is only invoked if the entry needs to be validated.
+        """
+        with self._lock:
+            entry = self._entries.get(id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(id)
+        revision, checked, payload, size = entry
+        now = time.monotonic()
+        if now - checked >= self.staleness:
+            if current_revision() != revision:
+                with self._lock:
+                    self.misses += 1
+                    self._remove(id, entry)
+                return None
+            entry[1] = now
+        with self._lock:
+            self.hits += 1
+        return revision, payload
+
+    def put(self, id, revision, payload):
+        """
+        Adds or replaces the *payload* of the session with given *id*.
+        """
+        size = 0
+        if self.max_bytes:
+            size = len(pickle.dumps(payload, pickle.HIGHEST_PROTOCOL))
+            if size > self.max_bytes:
+                self.discard(id)
+                return
+        with self._lock:
+            if id in self._entries:
+                self._remove(id, self._entries[id])
+            self._entries[id] = [revision, time.monotonic(), payload, size]
+            self.size += size
+            while len(self._entries) > self.max_entries or \
+                    (self.max_bytes and self.size > self.max_bytes):
+                old_id, old_entry = self._entries.popitem(last=False)
+                self.size -= old_entry[3]
+
+    def discard(self, id):
+        """
+        Removes the session with given *id* from the cache.
+        """
+        with self._lock:
+            if id in self._entries:
+                self._remove(id, self._entries[id])
+
+    def _remove(self, id, entry):
+        if self._entries.get(id) is entry:
+            del self._entries[id]
+            self.size -= entry[3]
+
+
+class NegativeCache:
+    """
+    An in-process LRU cache of session ids, that were not found in the
+    backend. It holds at most *max_entries* ids, each one for *ttl* seconds.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # maps ids to the time they were first reported and the time their
+        # entry expires, which is None until the id is actually cached
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, id):
+        with self._lock:
+            entry = self._entries.get(id)
+            if entry is None or entry[1] is None:
+                self.misses += 1
+                return False
+            if entry[1] <= time.monotonic():
+                del self._entries[id]
+                self.misses += 1
+                return False
+            self._entries.move_to_end(id)
+            self.hits += 1
+            return True
+
+    def add(self, id, grace=0):
+        """
+        Remembers that the session with given *id* does not exist. If a
+        *grace* period is given, the id is only cached if it was already
+        reported at least *grace* seconds ago.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(id)
+            if entry is None:
+                entry = self._entries[id] = [now, None]
+            if now - entry[0] >= grace:
+                entry[1] = now + self.ttl
+            self._entries.move_to_end(id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, id):
+        """
+        Removes given *id* from the cache.
+        """
+        with self._lock:
+            self._entries.pop(id, None)
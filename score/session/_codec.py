@@ -0,0 +1,208 @@
+# Copyright © 2015-2018 STRG.AT GmbH, Vienna, Austria
+# Copyright © 2019-2020 Necdet Can Ateşman <can@atesman.at>, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in
+# the file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district
+# the Licensee has his registered seat, an establishment or assets.
+
+import json
+import pickle
+import time
+import types
+import zlib
+
+
+class JsonSerializer:
+
+    def dumps(self, value):
+        return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data.decode('utf-8'))
+
+
+class MsgpackSerializer:
+
+    def __init__(self):
+        import msgpack
+        self._msgpack = msgpack
+
+    def dumps(self, value):
+        return self._msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, data):
+        return self._msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+class PickleSerializer:
+    """
+    Pickles values, but will only pickle and unpickle instances of classes
+    whose dotted paths are in the list of *allowed* classes. Builtin
+    containers and scalars do not need to be listed.
+    """
+
+    def __init__(self, allowed=()):
+        self.allowed = frozenset(allowed)
+
+    def dumps(self, value):
+        # values, that could not be unpickled, must already be rejected when
+        # they are stored
+        import io
+        file = io.BytesIO()
+        _RestrictedPickler(self.allowed, file).dump(value)
+        return file.getvalue()
+
+    def loads(self, data):
+        return _RestrictedUnpickler(self.allowed, data).load()
+
+
+class _RestrictedPickler(pickle.Pickler):
+
+    def __init__(self, allowed, file):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.allowed = allowed
+
+    def reducer_override(self, obj):
+        # invoked for all values, that are not builtin containers or scalars
+        if not isinstance(obj, (type, types.FunctionType,
+                                types.BuiltinFunctionType)):
+            obj = type(obj)
+        path = '%s.%s' % (obj.__module__, obj.__qualname__)
+        if path not in self.allowed:
+            raise pickle.PicklingError('Class %s is not allowed' % path)
+        return NotImplemented
+
+
+class _RestrictedUnpickler(pickle.Unpickler):
+
+    def __init__(self, allowed, data):
+        import io
+        super().__init__(io.BytesIO(data))
+        self.allowed = allowed
+
+    def find_class(self, module, name):
+        if '%s.%s' % (module, name) not in self.allowed:
+            raise pickle.UnpicklingError(
+                'Class %s.%s is not allowed' % (module, name))
+        return super().find_class(module, name)
+
+
+class ZlibCompression:
+
+    flag = b'z'
+
+    def compress(self, data):
+        return zlib.compress(data)
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+
+class Lz4Compression:
+
+    flag = b'l'
+
+    def __init__(self):
+        import lz4.frame
+        self._lz4 = lz4.frame
+
+    def compress(self, data):
+        return self._lz4.compress(data)
+
+    def decompress(self, data):
+        return self._lz4.decompress(data)
+
+
+serializers = {
+    'json': JsonSerializer,
+    'msgpack': MsgpackSerializer,
+    'pickle': PickleSerializer,
+}
+
+compressions = {
+    'zlib': ZlibCompression,
+    'lz4': Lz4Compression,
+}
+
+
+class Codec:
+    """
+    Converts session payloads to bytes and back. Encoded values larger than
+    *threshold* bytes are compressed, if a *compression* was given. The
+    encoded value is prefixed with a single byte denoting the compression, so
+    values can still be decoded after the compression was reconfigured.
+
+    Instances keep track of the number of encoded and decoded values, their
+    total size in bytes and the time spent encoding and decoding them.
+    """
+
+    _uncompressed = b'\x00'
+
+    def __init__(self, serializer, compression=None, threshold=1024):
+        self.serializer = serializer
+        self.compression = compression
+        self.threshold = threshold
+        self.encoded = 0
+        self.encoded_bytes = 0
+        self.encode_time = 0.0
+        self.decoded = 0
+        self.decoded_bytes = 0
+        self.decode_time = 0.0
+        self._decompressors = {}
+        for compression in compressions.values():
+            try:
+                self._decompressors[compression.flag] = compression()
+            except ImportError:
+                pass
+
+    def encode(self, value):
+        start = time.perf_counter()
+        data = self.serializer.dumps(value)
+        if self.compression is not None and len(data) > self.threshold:
+            data = self.compression.flag + self.compression.compress(data)
+        else:
+            data = self._uncompressed + data
+        self.encode_time += time.perf_counter() - start
+        self.encoded += 1
+        self.encoded_bytes += len(data)
+        return data
+
+    def decode(self, data):
+        """
+        Decodes given *data*, raising a `ValueError` if it was not encoded by
+        a codec, or cannot be decoded with the available compressions.
+        """
+        start = time.perf_counter()
+        if not isinstance(data, bytes):
+            raise ValueError('Not an encoded value: %r' % (type(data),))
+        flag, body = data[:1], data[1:]
+        try:
+            if flag != self._uncompressed:
+                body = self._decompressors[flag].decompress(body)
+            value = self.serializer.loads(body)
+        except Exception as e:
+            raise ValueError('Could not decode value') from e
+        self.decode_time += time.perf_counter() - start
+        self.decoded += 1
+        self.decoded_bytes += len(data)
+        return value
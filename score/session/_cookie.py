@@ -0,0 +1,247 @@
+# Copyright © 2015-2018 STRG.AT GmbH, Vienna, Austria
+# Copyright © 2019-2020 Necdet Can Ateşman <can@atesman.at>, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in
+# the file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district
+# the Licensee has his registered seat, an establishment or assets.
+
+
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+from ._init import DictSession
+
+
+def _b64encode(value):
+    return base64.urlsafe_b64encode(value).rstrip(b'=')
+
+
+def _b64decode(value):
+    return base64.urlsafe_b64decode(value + b'=' * (-len(value) % 4))
+
+
+def _dumps(data):
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+class Signer:
+    """
+    Converts session dicts to signed, url-safe strings and back. The strings
+    contain the JSON-encoded dict, the time of their creation and an
+    HMAC-SHA256 signature of both, separated by tildes.
+    """
+
+    def __init__(self, secret):
+        if isinstance(secret, str):
+            secret = secret.encode('utf-8')
+        # the key is processed once, signing a value only needs a copy of
+        # the prepared hmac object
+        self._hmac = hmac.new(secret, digestmod=hashlib.sha256)
+
+    def _sign(self, message):
+        mac = self._hmac.copy()
+        mac.update(message)
+        return _b64encode(mac.digest())
+
+    def dumps(self, data):
+        message = b'%s~%x' % (_b64encode(_dumps(data)), int(time.time()))
+        return (message + b'~' + self._sign(message)).decode('ascii')
+
+    def loads(self, token, max_age=None):
+        """
+        Returns the dict contained in given *token*, or `None` if the token
+        is invalid or older than *max_age* seconds.
+        """
+        token = token.encode('utf-8')
+        message, sep, signature = token.rpartition(b'~')
+        if not sep or not hmac.compare_digest(self._sign(message), signature):
+            return None
+        payload, sep, issued = message.partition(b'~')
+        try:
+            if max_age is not None and \
+                    time.time() - int(issued, 16) > max_age:
+                return None
+            return json.loads(_b64decode(payload).decode('utf-8'))
+        except ValueError:
+            return None
+
+    def issued(self, token):
+        """
+        Returns the creation time of given *token*, which must be valid.
+        """
+        message = token.encode('utf-8').rpartition(b'~')[0]
+        return int(message.partition(b'~')[2], 16)
+
+
+class EncryptingSigner:
+    """
+    A :class:`Signer` that also encrypts the session dict using Fernet_ from
+    the cryptography_ package.
+
+    .. _Fernet: https://cryptography.io/en/latest/fernet/
+    .. _cryptography: https://pypi.org/project/cryptography/
+    """
+
+    def __init__(self, secret):
+        from cryptography.fernet import Fernet, InvalidToken
+        if isinstance(secret, str):
+            secret = secret.encode('utf-8')
+        key = base64.urlsafe_b64encode(hashlib.sha256(secret).digest())
+        self._fernet = Fernet(key)
+        self._invalid = InvalidToken
+
+    def dumps(self, data):
+        token = self._fernet.encrypt(_dumps(data)).rstrip(b'=')
+        # the prefix distinguishes tokens from ids of the fallback backend
+        return 'e~' + token.decode('ascii')
+
+    def loads(self, token, max_age=None):
+        prefix, sep, token = token.partition('~')
+        if prefix != 'e' or not sep:
+            return None
+        if max_age is not None:
+            max_age = int(max_age)
+        try:
+            token = token.encode('ascii')
+            data = self._fernet.decrypt(token + b'=' * (-len(token) % 4),
+                                        ttl=max_age)
+            return json.loads(data.decode('utf-8'))
+        except (self._invalid, ValueError):
+            return None
+
+    def issued(self, token):
+        token = token.partition('~')[2].encode('ascii')
+        return self._fernet.extract_timestamp(
+            token + b'=' * (-len(token) % 4))
+
+
+class CookieSession(DictSession):
+    """
+    Session backend storing the whole session dict in the session cookie.
+    The :attr:`id <score.session.Session.id>` of such a session is the signed
+    cookie value, which changes whenever the session is stored.
+
+    Sessions exceeding the configured size are moved to the *fallback*
+    session class, if there is one. The id of these sessions is the id of the
+    fallback session and they remain in the fallback backend from then on.
+    """
+
+    __slots__ = ('_server_session',)
+
+    _signer = None
+    _max_size = 4000
+    _fallback = None
+
+    def __init__(self, *args, **kwargs):
+        # the session of the fallback backend, if the data was moved there
+        self._server_session = None
+        super().__init__(*args, **kwargs)
+
+    def _load(self, id):
+        if '~' not in id:
+            # not a token, but the id of a session in the fallback backend
+            if self._fallback is None:
+                return None
+            session = self._fallback(self._ctx, id)
+            if session.id is None:
+                return None
+            self._server_session = session
+            return dict(session.items())
+        return self._signer.loads(id, self._expire)
+
+    def _id_is_valid(self, id):
+        data = self._load(id)
+        if data is None:
+            return False
+        self._cached_dict = data
+        return True
+
+    def _create_dict(self):
+        if self.id is None:
+            return {}
+        if self._server_session is not None:
+            return dict(self._server_session.items())
+        return self._signer.loads(self.id) or {}
+
+    def _store(self):
+        data = self._dict
+        if self._server_session is None:
+            token = self._signer.dumps(data)
+            if len(token) <= self._max_size:
+                self.id = token
+                return
+            if self._fallback is None:
+                raise ValueError(
+                    'Session exceeds `signed_cookie.max_size` (%d > %d)' %
+                    (len(token), self._max_size))
+            self._server_session = self._fallback(self._ctx, None)
+            changes = list(data)
+        else:
+            changes = self._changes
+        session = self._server_session
+        for key in changes:
+            if key in data:
+                session[key] = data[key]
+            else:
+                del session[key]
+        session.store()
+        self.id = session.id
+
+    def _touch(self):
+        self._validate()
+        if self.id is None:
+            return
+        if self._server_session is not None:
+            self._server_session._touch()
+        else:
+            # issue a new token to renew its age
+            self.id = self._signer.dumps(self._dict)
+
+    def _renewal_due(self, fraction):
+        self._validate()
+        if self._server_session is not None:
+            return self._server_session._renewal_due(fraction)
+        age = time.time() - self._signer.issued(self.id)
+        return age >= self._expire * fraction
+
+    def _revert(self):
+        # the dict must be restored from the current id, which may differ
+        # from the one this session was loaded with
+        self._cached_dict = None
+        self._cached_dict = self._create_dict()
+
+    @classmethod
+    def _collect_garbage(cls, ctx, limit):
+        if cls._fallback is None:
+            return 0
+        return cls._fallback._collect_garbage(ctx, limit)
+
+    @classmethod
+    def _load_batch(cls, ctx, after, limit):
+        # only sessions of the fallback backend can be enumerated
+        if cls._fallback is None:
+            return super()._load_batch(ctx, after, limit)
+        return cls._fallback._load_batch(ctx, after, limit)
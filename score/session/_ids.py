@@ -0,0 +1,141 @@
+# Copyright © 2015-2018 STRG.AT GmbH, Vienna, Austria
+# Copyright © 2019-2020 Necdet Can Ateşman <can@atesman.at>, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in
+# the file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district
+# the Licensee has his registered seat, an establishment or assets.
+
+
+import base64
+import hashlib
+import hmac
+import os
+import struct
+import time
+import uuid
+
+
+# 16 random bytes and the creation time in seconds, followed by an 8 byte
+# HMAC tag of these values
+_message = struct.Struct('>16sI')
+_size = _message.size + 8
+
+# the length of the url-safe base64 representation of an id
+_length = 38
+
+
+def _b64decode(value):
+    try:
+        return base64.urlsafe_b64decode(value + '==')
+    except (ValueError, TypeError):
+        return None
+
+
+def id_to_bytes(id):
+    """
+    Returns the compact binary form of an id created by :class:`IdFormat`,
+    or `None` if given value has the wrong format. The result is 28 bytes
+    long.
+    """
+    if not isinstance(id, str) or len(id) != _length:
+        return None
+    raw = _b64decode(id)
+    if raw is None or len(raw) != _size:
+        return None
+    if id_from_bytes(raw) != id:
+        # the last character contains unused bits, which must be zero
+        return None
+    return raw
+
+
+def id_from_bytes(raw):
+    """
+    Converts the binary form of an id back to its string form.
+    """
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def id_to_uuid(id):
+    """
+    Returns the random part of an id created by :class:`IdFormat` as a
+    :class:`uuid.UUID`, or `None` if given value has the wrong format.
+    """
+    raw = id_to_bytes(id)
+    if raw is None:
+        return None
+    return uuid.UUID(bytes=raw[:16])
+
+
+class IdFormat:
+    """
+    Creates and verifies session ids carrying an HMAC tag and their creation
+    time, which allows rejecting forged, malformed or expired ids without
+    contacting the backend. Ids are signed using the first of the given
+    *secrets*, all others are accepted during verification to allow key
+    rotation.
+    """
+
+    def __init__(self, secrets, max_age=None):
+        self._hmacs = [
+            hmac.new(secret.encode('utf-8'), digestmod=hashlib.sha256)
+            for secret in secrets]
+        self.max_age = max_age
+
+    def _tag(self, mac, message):
+        mac = mac.copy()
+        mac.update(message)
+        return mac.digest()[:8]
+
+    def generate(self):
+        """
+        Returns a new id.
+        """
+        message = _message.pack(os.urandom(16), int(time.time()))
+        return id_from_bytes(message + self._tag(self._hmacs[0], message))
+
+    def check(self, id):
+        """
+        Tests whether given *id* was created by this instance and has not
+        expired yet.
+        """
+        raw = id_to_bytes(id)
+        if raw is None:
+            return False
+        message, tag = raw[:_message.size], raw[_message.size:]
+        for mac in self._hmacs:
+            if hmac.compare_digest(self._tag(mac, message), tag):
+                break
+        else:
+            return False
+        if self.max_age is not None:
+            created = _message.unpack(message)[1]
+            if time.time() - created > self.max_age:
+                return False
+        return True
+
+    def age(self, id):
+        """
+        Returns the number of seconds since given valid *id* was created.
+        """
+        message = id_to_bytes(id)[:_message.size]
+        return time.time() - _message.unpack(message)[1]
@@ -26,24 +26,60 @@
 # the Licensee has his registered seat, an establishment or assets.
 
 import abc
+import asyncio
 import collections.abc
+import contextlib
 from copy import deepcopy
+import time
 import uuid
 
 from score.init import (
     ConfiguredModule, ConfigurationError, parse_bool, parse_time_interval,
-    parse_dotted_path)
+    parse_dotted_path, parse_list)
 from transaction.interfaces import IDataManager
 from zope.interface import implementer
 
+from ._readonly import freeze, thaw
+
 
 defaults = {
     'orm.class': None,
+    'orm.partial_updates': 'false',
+    'orm.tiered': 'false',
     'kvcache.container': 'score.session',
     'kvcache.livedata': 'false',
+    'kvcache.livedata.retries': '3',
+    'kvcache.layout': 'dict',
+    'kvcache.replicas': '1',
+    'signed_cookie': 'false',
+    'signed_cookie.secret': None,
+    'signed_cookie.encrypt': 'false',
+    'signed_cookie.max_size': '4000',
+    'signed_cookie.fallback': 'false',
+    'codec': None,
+    'codec.pickle.allow': '',
+    'codec.compression': None,
+    'codec.compression.threshold': '1024',
+    'expire': None,
+    'id.secret': None,
+    'id.max_age': None,
+    'lazy': 'false',
+    'readonly': 'false',
+    'local_cache.max_entries': '0',
+    'local_cache.max_bytes': None,
+    'local_cache.staleness': '0',
+    'negative_cache.max_entries': '0',
+    'negative_cache.ttl': '1m',
+    'negative_cache.grace': '10s',
+    'write_behind': 'false',
+    'write_behind.max_delay': '1s',
+    'write_behind.max_size': '1000',
+    'write_behind.flush_on_exit': 'true',
+    'write_behind.max_retries': '3',
     'ctx.member': 'session',
     'cookie': 'session',
     'cookie.max_age': None,
+    'cookie.refresh': None,
     'cookie.path': '/',
     'cookie.domain': None,
     'cookie.secure': True,
@@ -52,6 +88,10 @@ defaults = {
 }
 
 
+# the fraction of a session's lifetime, after which its expiry is renewed
+_default_refresh = 0.1
+
+
 def init(confdict, orm=None, kvcache=None, ctx=None):
     """
     Initializes this module acoording to :ref:`our module initialization
@@ -61,16 +101,293 @@ def init(confdict, orm=None, kvcache=None, ctx=None):
         The :func:`path <score.init.parse_dotted_path>` to the database class,
         that should be used as backend.
 
+    :confkey:`orm.partial_updates` :faint:`[default=false]`
+        Whether only the modified keys of the JSON data column should be
+        written when storing an existing session. This reduces the amount of
+        data the database needs to write on each update. Partial updates are
+        performed using ``jsonb_set`` on PostgreSQL and ``json_set`` on SQLite.
+        The whole column is rewritten on all other databases.
+
+    :confkey:`orm.tiered` :faint:`[default=false]`
+        Setting this value to `true` places the configured kvcache
+        `kvcache.container` in front of the database table. Sessions are read
+        from the cache and only loaded from the database on a cache miss, in
+        which case the cache is filled. Modified sessions are written to both
+        backends when the transaction is committed (write-through).
+
+        Enabling :confkey:`write_behind` in this mode writes the cache
+        immediately, but the database rows in a background thread, using a
+        separate transaction for each session (write-back). Modifications are
+        lost, if the cache entry expires before the database row was written.
+
+        The `kvcache.layout` and `kvcache.livedata` settings are not
+        available in this mode, and `orm.partial_updates` has no effect.
+
     :confkey:`kvcache.container` :faint:`[default=score.session]`
         The name of the :term:`cache container` to use for storing session
         data when using :mod:`score.kvcache` as backend.
 
+        This value may also be a :func:`list <score.init.parse_list>` of
+        container names, usually configured with different cache backends.
+        Sessions are distributed across these containers using consistent
+        hashing in this case, which means that adding another container
+        will only relocate a small fraction of all sessions. Note that
+        relocated sessions are lost, unless they can still be read from a
+        replica (see `kvcache.replicas`).
+
+    :confkey:`kvcache.replicas` :faint:`[default=1]`
+        The number of containers each session is written to, if multiple
+        containers are configured in `kvcache.container`. Sessions are read
+        from the first of these containers containing the session.
+
     :confkey:`kvcache.livedata` :faint:`[default=false]`
-        This value defines whether sessions must always pull the newest session
-        data for every operation. This has the advantage that all session data
-        will be immediately up-to-date across all processes using the same
-        session, but also the disadvantage that it will make using the session
-        a lot slower.
+        This value defines whether sessions must always operate on the newest
+        session data. Every stored session is assigned a revision in this mode
+        and every operation on a session compares the revision of its data
+        with the one in the cache. The session data is pulled again, if it
+        was modified by another process in the meantime. Unsaved modifications
+        of the current process are retained in that case.
+
+        Storing a session in this mode will merge the modified keys into the
+        latest session data in the cache, if necessary. Note that
+        :mod:`score.kvcache` does not provide an atomic compare-and-swap
+        operation, which means that a modification of another process may
+        still get lost, if it is stored at the very same time.
+
+        Enabling this mode changes the format of the stored data: all
+        processes sharing a container must use the same setting. Sessions
+        stored before enabling it are still read and are converted when they
+        are stored again.
+
+    :confkey:`kvcache.livedata.retries` :faint:`[default=3]`
+        The number of times the current session data is merged, if it changes
+        again while merging modifications during a store operation in
+        `livedata` mode. The session is stored regardless after the last
+        attempt.
+
+    :confkey:`kvcache.layout` :faint:`[default=dict]`
+        How session data is laid out in the kvcache container. The default
+        value `dict` stores the whole session dict as a single cache entry,
+        which is the fastest option for small sessions.
+
+        The alternative value `keys` stores each session value in a separate
+        cache entry, along with an index entry containing the list of keys.
+        Values are fetched only when they are accessed and only modified keys
+        are written back when the session is stored. This layout is
+        preferable for sessions containing a few large values, that rarely
+        change. Session keys must be strings when using this layout. If
+        :confkey:`expire` is configured, all entries of a session are
+        written whenever it is stored, since they need to be renewed.
+
+    :confkey:`signed_cookie` :faint:`[default=false]`
+        Setting this value to `true` stores the whole session in the session
+        cookie, instead of a backend. The session dict is encoded as JSON and
+        signed using HMAC-SHA256, which means that the client can read, but
+        not modify its contents. Loading such a session does not involve any
+        I/O. Session keys must be strings and values must be serializable to
+        JSON when using this backend.
+
+        The :attr:`id <score.session.Session.id>` of these sessions is the
+        cookie value itself, which changes whenever the session is modified.
+        Sessions older than :confkey:`expire` are rejected, if it is
+        configured.
+
+    :confkey:`signed_cookie.secret` :faint:`[default=None]`
+        The secret key for signing session cookies. This value is mandatory
+        when using `signed_cookie` and must be shared by all processes.
+
+    :confkey:`signed_cookie.encrypt` :faint:`[default=false]`
+        Whether session cookies should be encrypted, too, using Fernet_
+        from the cryptography_ package. Clients will not be able to read the
+        contents of their session in this mode.
+
+        .. _Fernet: https://cryptography.io/en/latest/fernet/
+        .. _cryptography: https://pypi.org/project/cryptography/
+
+    :confkey:`signed_cookie.max_size` :faint:`[default=4000]`
+        The maximum length of the cookie value in bytes. Browsers usually
+        refuse cookies larger than 4096 bytes, including the cookie's name
+        and parameters. Storing a larger session raises a `ValueError`,
+        unless `signed_cookie.fallback` is enabled.
+
+    :confkey:`signed_cookie.fallback` :faint:`[default=false]`
+        Whether sessions exceeding `signed_cookie.max_size` should be moved
+        to the orm or kvcache backend, which must be configured as usual in
+        this case. The cookie will only contain the id of the session in the
+        fallback backend, and the session will remain there from then on.
+
+    :confkey:`codec` :faint:`[default=None]`
+        The serialization format of session payloads in the kvcache
+        container. The default value `None` passes session dicts to
+        :mod:`score.kvcache` unaltered, leaving the serialization to the
+        cache backend. Other valid values are `json`, `msgpack` (requires the
+        msgpack_ package) and `pickle`. Enabling a codec changes the format
+        of the stored data: all processes sharing a container must use the
+        same setting. Sessions, whose payloads cannot be decoded, are treated
+        as unknown sessions.
+
+        The configured codec is available as :attr:`codec
+        <score.session.ConfiguredSessionModule.codec>`, which keeps track of
+        encoded and decoded sizes and the time spent on these operations.
+
+        .. _msgpack: https://pypi.org/project/msgpack/
+
+    :confkey:`codec.pickle.allow` :faint:`[default=]`
+        The :func:`list <score.init.parse_list>` of dotted paths of classes,
+        that may be pickled and unpickled when using the `pickle` codec.
+        Builtin types like `dict`, `list`, `set`, `str` or `int` do not need
+        to be listed. Storing a session containing instances of other classes
+        raises a :class:`pickle.PicklingError`.
+
+    :confkey:`codec.compression` :faint:`[default=None]`
+        The compression of encoded payloads exceeding
+        `codec.compression.threshold` bytes. Valid values are `zlib` and `lz4`
+        (requires the lz4_ package).
+
+        .. _lz4: https://pypi.org/project/lz4/
+
+    :confkey:`codec.compression.threshold` :faint:`[default=1024]`
+        The minimum size of an encoded payload in bytes, before it is
+        compressed.
+
+    :confkey:`expire` :faint:`[default=None]`
+        The :func:`time interval <score.init.parse_time_interval>` after
+        which a session expires, if it is not stored again. The default
+        value `None` keeps sessions forever.
+
+        The kvcache backend stores all entries of a session with this expiry.
+        The orm backend writes the expiry date into the ``expires`` column of
+        the :class:`OrmSessionMixin <score.session.orm.OrmSessionMixin>`.
+        Expired rows are no longer loaded, but need to be removed from the
+        database by calling :meth:`collect_garbage
+        <score.session.ConfiguredSessionModule.collect_garbage>`
+        periodically.
+
+    :confkey:`id.secret` :faint:`[default=None]`
+        Session ids are random UUIDs by default, which can only be validated
+        by looking them up in the backend. Configuring a secret key here
+        creates ids containing their creation time and an HMAC tag instead,
+        which allows rejecting forged or malformed ids without contacting
+        the backend. The value may be a :func:`list <score.init.parse_list>`
+        of keys: new ids are signed with the first one, the others remain
+        valid to allow rotating keys.
+
+        These ids are 38 characters long. The ``id`` column of the
+        :class:`OrmSessionMixin <score.session.orm.OrmSessionMixin>` stores
+        their random part only, as a UUID. Note that sessions with regular
+        UUID ids become invalid when enabling this feature.
+
+    :confkey:`id.max_age` :faint:`[default=None]`
+        The :func:`time interval <score.init.parse_time_interval>` after
+        which ids created with an `id.secret` are rejected, regardless of
+        the session's activity.
+
+    :confkey:`lazy` :faint:`[default=false]`
+        Whether session ids should be validated lazily. The default behaviour
+        is to check a session id against the backend as soon as the session
+        is loaded. When this value is `true`, the backend will only be
+        contacted once the session data is accessed for the first time.
+        Requests that merely pass the session id around will not cause any
+        backend operations in this mode.
+
+        Note that the :attr:`id <score.session.Session.id>` of a lazy session
+        is not guaranteed to be valid until the session data was accessed.
+
+    :confkey:`readonly` :faint:`[default=false]`
+        Session values are deep-copied when they are read by default, to make
+        sure that callers cannot modify the stored data by accident. Setting
+        this value to `true` will return read-only views instead: dicts are
+        wrapped in a :class:`FrozenDict <score.session.FrozenDict>`, lists in a
+        :class:`FrozenList <score.session.FrozenList>`, and sets are converted
+        to `frozenset` objects. This is a lot faster for large session values,
+        but the returned objects are not instances of `dict` or `list`. Call
+        their ``copy()`` method to get a mutable copy.
+
+    :confkey:`local_cache.max_entries` :faint:`[default=0]`
+        The number of sessions to keep in an in-process LRU cache. A value
+        greater than zero enables the cache, which is currently only
+        supported by the kvcache backend using the `dict` layout.
+
+        Every stored session is assigned a new revision, which is stored in a
+        separate, small cache entry. Loading a cached session will only fetch
+        this revision from the kvcache container, instead of the whole
+        session payload. Note that enabling the cache changes the format of
+        the stored data: all processes sharing a container must use the same
+        setting.
+
+        The hit and miss counters of the cache are available as
+        :attr:`cache.hits <score.session.ConfiguredSessionModule.cache>` and
+        ``cache.misses``.
+
+    :confkey:`local_cache.max_bytes` :faint:`[default=None]`
+        An optional upper limit for the size of all cached session payloads.
+        The size of a payload is determined by pickling it.
+
+    :confkey:`local_cache.staleness` :faint:`[default=0]`
+        The :func:`time interval <score.init.parse_time_interval>` during
+        which a cached session is used without comparing its revision with
+        the backend. Processes may operate on outdated session data for this
+        long, if the same session is modified in another process.
+
+    :confkey:`negative_cache.max_entries` :faint:`[default=0]`
+        The number of unknown session ids to remember in an in-process LRU
+        cache. A value greater than zero enables the cache, which rejects
+        these ids without contacting the backend when they are presented
+        again. This protects the backend from clients repeatedly sending
+        cookies of sessions, that no longer exist.
+
+        The ids of sessions stored by the current process are removed from
+        the cache. Sessions created by other processes may be requested
+        before they were written, though, which is why new ids are never
+        cached: ids younger than `negative_cache.grace` are looked up in the
+        backend. The age of an id is only known, if an :confkey:`id.secret`
+        is configured. Other ids are only cached, if they were still unknown
+        `negative_cache.grace` after they were first looked up.
+
+        The hit and miss counters of the cache are available as
+        :attr:`negative_cache.hits
+        <score.session.ConfiguredSessionModule.negative_cache>` and
+        ``negative_cache.misses``.
+
+    :confkey:`negative_cache.ttl` :faint:`[default=1m]`
+        The :func:`time interval <score.init.parse_time_interval>` during
+        which an unknown id is rejected without contacting the backend.
+
+    :confkey:`negative_cache.grace` :faint:`[default=10s]`
+        The minimum age of an id, before it can be added to the negative
+        cache. Must be larger than the time needed to store a new session,
+        including :confkey:`write_behind.max_delay`.
+
+    :confkey:`write_behind` :faint:`[default=false]`
+        Setting this value to `true` will write modified sessions in a
+        background thread instead of writing them when the transaction is
+        committed. Sessions, that are modified multiple times before the
+        background thread gets to write them, will only be written once.
+        This is currently only supported by the kvcache backend using the
+        `dict` layout and cannot be combined with `kvcache.livedata`.
+
+        Note that pending modifications are only visible to the current
+        process until they are written: other processes will see the
+        previous session data for up to `write_behind.max_delay`.
+
+    :confkey:`write_behind.max_delay` :faint:`[default=1s]`
+        The :func:`time interval <score.init.parse_time_interval>` between
+        two flushes of the write-behind queue.
+
+    :confkey:`write_behind.max_size` :faint:`[default=1000]`
+        The maximum number of sessions in the write-behind queue. If the queue
+        is full, the request adding the next session will write all pending
+        sessions synchronously.
+
+    :confkey:`write_behind.flush_on_exit` :faint:`[default=true]`
+        Whether pending sessions should be written when the interpreter shuts
+        down. Disabling this will lose all pending modifications on exit.
+
+    :confkey:`write_behind.max_retries` :faint:`[default=3]`
+        The number of times the write of a session is retried, if it fails.
+        Failures are logged and do not keep the other pending sessions from
+        being written. The modifications of the session are lost after the
+        last attempt.
 
     :confkey:`ctx.member` :faint:`[default=session]`
         This is the name of the :term:`context member`, that should be
@@ -87,6 +404,25 @@ def init(confdict, orm=None, kvcache=None, ctx=None):
         The max-age parameter of the cookie. The default value of `None` means
         that the cookie will be valid until the browser is closed.
 
+    :confkey:`cookie.refresh` :faint:`[default=None]`
+        Sessions with a `cookie.max_age` will send their cookie with each
+        response by default, to keep it alive. This value can be set to a
+        fraction of the max-age (like `0.1`) to send the cookie only if that
+        fraction of its lifetime has passed. The time of the last refresh is
+        embedded in the cookie value for this purpose.
+
+        The same policy determines when the expiry of an unmodified session
+        is renewed in the backend, if :confkey:`expire` is configured. The
+        fraction then applies to the shorter of both lifetimes and defaults
+        to `0.1`, to avoid writing to the backend with every request.
+        Modified sessions are always stored with a new expiry.
+
+        The orm backend and the `signed_cookie` backend know the expiry of
+        their sessions and will only renew it, if that fraction of the
+        session's lifetime has passed, even without a `cookie.max_age`. The
+        kvcache backend, including `orm.tiered`, relies on the cookie alone
+        and thus requires a `cookie.max_age` if sessions expire.
+
     :confkey:`cookie.path` :faint:`[default=/]`
         The path parameter of the cookie.
 
@@ -119,18 +455,57 @@ def init(confdict, orm=None, kvcache=None, ctx=None):
     if ctx and conf['ctx.member'] not in (None, 'None'):
         ctx_member = conf['ctx.member']
     cookie_kwargs = parse_cookie_kwargs(conf)
-    session = ConfiguredSessionModule(ctx, ctx_member, cookie_kwargs)
-    session.Session = _init_orm_backend(conf, session, orm, ctx)
-    if not session.Session:
-        session.Session = _init_kvcache_backend(conf, session, kvcache)
+    cookie_refresh = None
+    if conf['cookie.refresh'] not in (None, 'None'):
+        if not cookie_kwargs or 'max_age' not in cookie_kwargs:
+            import score.session
+            raise ConfigurationError(
+                score.session, '`cookie.refresh` requires `cookie.max_age`')
+        cookie_refresh = float(conf['cookie.refresh'])
+    elif conf['expire'] not in (None, 'None') and \
+            cookie_kwargs and 'max_age' in cookie_kwargs:
+        # the expiry of sessions is renewed whenever the cookie is refreshed,
+        # which must not happen with every request
+        cookie_refresh = _default_refresh
+    session = ConfiguredSessionModule(ctx, ctx_member, cookie_kwargs,
+                                      cookie_refresh=cookie_refresh)
+    signed_cookie = parse_bool(conf['signed_cookie'])
+    session.Session = None
+    if not signed_cookie or parse_bool(conf['signed_cookie.fallback']):
+        session.Session = _init_orm_backend(conf, session, orm, ctx, kvcache)
+        if not session.Session:
+            session.Session = _init_kvcache_backend(conf, session, kvcache)
         if not session.Session:
             import score.session
             raise ConfigurationError(
                 score.session, 'Neither kvcache nor orm backend configured')
+        if conf['expire'] not in (None, 'None'):
+            session.Session._expire = parse_time_interval(conf['expire'])
+        if conf['id.secret'] not in (None, 'None'):
+            _init_ids(conf, session)
+        if conf['codec'] not in (None, 'None'):
+            _init_codec(conf, session)
+        if int(conf['local_cache.max_entries']):
+            _init_local_cache(conf, session)
+        if int(conf['negative_cache.max_entries']):
+            _init_negative_cache(conf, session)
+        if parse_bool(conf['write_behind']):
+            _init_write_behind(conf, session)
+    if signed_cookie:
+        session.Session = _init_cookie_backend(conf, session, session.Session)
+    if conf['expire'] not in (None, 'None') and ctx_member and \
+            cookie_kwargs and 'max_age' not in cookie_kwargs and \
+            not session.Session._tracks_renewal:
+        # neither the cookie nor the backend would know when a session was
+        # last renewed
+        import score.session
+        raise ConfigurationError(
+            score.session,
+            '`expire` requires `cookie.max_age` with the kvcache backend')
     return session
 
 
-def _init_orm_backend(conf, session, orm, ctx):
+def _init_orm_backend(conf, session, orm, ctx, kvcache=None):
     if 'orm.class' not in conf:
         return None
     if not conf['orm.class'] or conf['orm.class'] == 'None':
@@ -145,7 +520,7 @@ def _init_orm_backend(conf, session, orm, ctx):
         raise ConfigurationError(
             score.session,
             'Need score.ctx in order to use `orm.class`')
-    from .orm import OrmSessionMixin, OrmSession
+    from .orm import OrmSessionMixin, OrmSession, _value_columns
     class_ = parse_dotted_path(conf['orm.class'])
     if not issubclass(class_, OrmSessionMixin):
         import score.session
@@ -162,26 +537,243 @@ def _init_orm_backend(conf, session, orm, ctx):
         raise ConfigurationError(
             score.session,
             'Configured score.sa.orm uses different score.ctx dependency')
+    if parse_bool(conf['orm.tiered']):
+        return _init_tiered_backend(conf, session, orm, ctx, kvcache, class_)
     return type('ConfiguredOrmSession', (OrmSession,), {
+        '__slots__': (),
         '_has_ctx': ctx is not None,
         '_conf': session,
+        '_lazy': parse_bool(conf['lazy']),
+        '_readonly': parse_bool(conf['readonly']),
         '_orm_conf': orm,
         '_orm_class': class_,
-        '_orm': property(lambda self: orm.get_session(self._ctx)),
+        '_partial_updates': parse_bool(conf['orm.partial_updates']),
+        '_columns': tuple(_value_columns(class_)),
     })
 
 
+def _init_tiered_backend(conf, session, orm, ctx, kvcache, class_):
+    from .orm import TieredSession, _value_columns
+    import score.session
+    if not kvcache:
+        raise ConfigurationError(
+            score.session, 'Need score.kvcache in order to use `orm.tiered`')
+    if conf['kvcache.layout'].strip().lower() != 'dict':
+        raise ConfigurationError(
+            score.session, '`orm.tiered` requires the `dict` layout')
+    if parse_bool(conf['kvcache.livedata']):
+        raise ConfigurationError(
+            score.session,
+            '`orm.tiered` cannot be combined with `kvcache.livedata`')
+    return type('ConfiguredTieredSession', (TieredSession,), {
+        '__slots__': (),
+        '_has_ctx': ctx is not None,
+        '_conf': session,
+        '_lazy': parse_bool(conf['lazy']),
+        '_readonly': parse_bool(conf['readonly']),
+        '_livedata': False,
+        '_livedata_retries': 0,
+        '_versioned': False,
+        '_container': _init_kvcache_container(conf, kvcache),
+        '_orm_conf': orm,
+        '_orm_class': class_,
+        '_columns': tuple(_value_columns(class_)),
+    })
+
+
+def _init_kvcache_container(conf, kvcache):
+    names = parse_list(conf['kvcache.container'])
+    if len(names) <= 1:
+        return kvcache[conf['kvcache.container']]
+    from ._sharding import ShardedContainer
+    replicas = int(conf['kvcache.replicas'])
+    if not 1 <= replicas <= len(names):
+        import score.session
+        raise ConfigurationError(
+            score.session,
+            '`kvcache.replicas` must be between 1 and the number of '
+            'containers')
+    return ShardedContainer([kvcache[name] for name in names], replicas)
+
+
 def _init_kvcache_backend(conf, session, kvcache):
     if not kvcache:
         return None
-    from ._kvcache import KvcacheSession
-    return type('ConfiguredKvcacheSession', (KvcacheSession,), {
+    from ._kvcache import KvcacheSession, KeyedKvcacheSession
+    layouts = {
+        'dict': KvcacheSession,
+        'keys': KeyedKvcacheSession,
+    }
+    layout = conf['kvcache.layout'].strip().lower()
+    if layout not in layouts:
+        import score.session
+        raise ConfigurationError(
+            score.session,
+            'Invalid `kvcache.layout` "%s"' % conf['kvcache.layout'])
+    if layout != 'dict' and parse_bool(conf['kvcache.livedata']):
+        import score.session
+        raise ConfigurationError(
+            score.session,
+            '`kvcache.livedata` requires the `dict` layout')
+    return type('ConfiguredKvcacheSession', (layouts[layout],), {
+        '__slots__': (),
         '_conf': session,
+        '_lazy': parse_bool(conf['lazy']),
+        '_readonly': parse_bool(conf['readonly']),
         '_livedata': parse_bool(conf['kvcache.livedata']),
-        '_container': kvcache[conf['kvcache.container']],
+        '_livedata_retries': int(conf['kvcache.livedata.retries']),
+        '_versioned': parse_bool(conf['kvcache.livedata']),
+        '_container': _init_kvcache_container(conf, kvcache),
     })
 
 
+def _init_cookie_backend(conf, session, fallback):
+    from ._cookie import CookieSession, Signer, EncryptingSigner
+    import score.session
+    if not conf['signed_cookie.secret']:
+        raise ConfigurationError(
+            score.session, '`signed_cookie` requires `signed_cookie.secret`')
+    signer = Signer
+    if parse_bool(conf['signed_cookie.encrypt']):
+        signer = EncryptingSigner
+    try:
+        signer = signer(conf['signed_cookie.secret'])
+    except ImportError:
+        raise ConfigurationError(
+            score.session,
+            '`signed_cookie.encrypt` requires the cryptography package')
+    expire = None
+    if conf['expire'] not in (None, 'None'):
+        expire = parse_time_interval(conf['expire'])
+    return type('ConfiguredCookieSession', (CookieSession,), {
+        '__slots__': (),
+        '_conf': session,
+        '_lazy': parse_bool(conf['lazy']),
+        '_readonly': parse_bool(conf['readonly']),
+        '_expire': expire,
+        '_signer': signer,
+        '_max_size': int(conf['signed_cookie.max_size']),
+        '_fallback': fallback,
+        # tokens contain their creation time
+        '_tracks_renewal': fallback is None or fallback._tracks_renewal,
+    })
+
+
+def _init_ids(conf, session):
+    from ._ids import IdFormat
+    max_age = None
+    if conf['id.max_age'] not in (None, 'None'):
+        max_age = parse_time_interval(conf['id.max_age'])
+    session.Session._ids = IdFormat(parse_list(conf['id.secret']), max_age)
+
+
+def _init_codec(conf, session):
+    from ._kvcache import KvcacheSession
+    from ._codec import Codec, PickleSerializer, serializers, compressions
+    import score.session
+    if not issubclass(session.Session, KvcacheSession):
+        raise ConfigurationError(
+            score.session, '`codec` requires the kvcache backend')
+    name = conf['codec'].strip().lower()
+    if name not in serializers:
+        raise ConfigurationError(
+            score.session, 'Invalid `codec` "%s"' % conf['codec'])
+    compression = None
+    if conf['codec.compression'] not in (None, 'None'):
+        compression_name = conf['codec.compression'].strip().lower()
+        if compression_name not in compressions:
+            raise ConfigurationError(
+                score.session,
+                'Invalid `codec.compression` "%s"' % conf['codec.compression'])
+        try:
+            compression = compressions[compression_name]()
+        except ImportError:
+            raise ConfigurationError(
+                score.session,
+                'Compression `%s` is not installed' % compression_name)
+    try:
+        if name == 'pickle':
+            serializer = PickleSerializer(
+                parse_list(conf['codec.pickle.allow']))
+        else:
+            serializer = serializers[name]()
+    except ImportError:
+        raise ConfigurationError(
+            score.session, 'Codec `%s` is not installed' % name)
+    codec = Codec(serializer, compression,
+                  int(conf['codec.compression.threshold']))
+    session.Session._codec = codec
+    session.codec = codec
+
+
+def _init_local_cache(conf, session):
+    from ._kvcache import KvcacheSession, KeyedKvcacheSession
+    from ._cache import LocalCache
+    if not issubclass(session.Session, KvcacheSession) or \
+            issubclass(session.Session, KeyedKvcacheSession):
+        import score.session
+        raise ConfigurationError(
+            score.session,
+            '`local_cache` requires the kvcache backend with `dict` layout')
+    max_bytes = None
+    if conf['local_cache.max_bytes'] not in (None, 'None'):
+        max_bytes = int(conf['local_cache.max_bytes'])
+    cache = LocalCache(
+        int(conf['local_cache.max_entries']),
+        max_bytes,
+        parse_time_interval(conf['local_cache.staleness']))
+    session.Session._cache = cache
+    session.Session._versioned = True
+    session.cache = cache
+
+
+def _init_negative_cache(conf, session):
+    from ._cache import NegativeCache
+    cache = NegativeCache(
+        int(conf['negative_cache.max_entries']),
+        parse_time_interval(conf['negative_cache.ttl']))
+    grace = parse_time_interval(conf['negative_cache.grace'])
+    if parse_bool(conf['write_behind']) and \
+            grace <= parse_time_interval(conf['write_behind.max_delay']):
+        import score.session
+        raise ConfigurationError(
+            score.session,
+            '`negative_cache.grace` must be larger than '
+            '`write_behind.max_delay`')
+    session.Session._negative_cache = cache
+    session.Session._negative_cache_grace = grace
+    session.negative_cache = cache
+
+
+def _init_write_behind(conf, session):
+    from ._kvcache import KvcacheSession, KeyedKvcacheSession
+    from ._writebehind import WriteBehindQueue
+    if not issubclass(session.Session, KvcacheSession) or \
+            issubclass(session.Session, KeyedKvcacheSession):
+        import score.session
+        raise ConfigurationError(
+            score.session,
+            '`write_behind` requires the kvcache backend with `dict` layout')
+    if session.Session._livedata:
+        import score.session
+        raise ConfigurationError(
+            score.session,
+            '`write_behind` cannot be combined with `kvcache.livedata`')
+    write = session.Session._write_payload
+    if hasattr(session.Session, '_write_back'):
+        # tiered sessions write their cache entries right away
+        write = session.Session._write_back
+    queue = WriteBehindQueue(
+        write,
+        parse_time_interval(conf['write_behind.max_delay']),
+        int(conf['write_behind.max_size']),
+        flush_on_exit=parse_bool(conf['write_behind.flush_on_exit']),
+        log=session.log,
+        max_retries=int(conf['write_behind.max_retries']))
+    session.Session._write_behind = queue
+    session._write_behind = queue
+
+
 def parse_cookie_kwargs(conf):
     if not conf['cookie'] or conf['cookie'] == 'None':
         return None
@@ -207,16 +799,23 @@ def parse_cookie_kwargs(conf):
     return cookie_kwargs
 
 
+# marker for keys, that did not exist before they were modified
+_missing = object()
+
+
 @implementer(IDataManager)
 class DataManager:
 
-    revert_data = None
+    __slots__ = ('session_conf', 'ctx', 'session', 'touch',
+                 'transaction_manager', 'journal')
 
-    def __init__(self, session_conf, ctx, session):
+    def __init__(self, session_conf, ctx, session, *, touch=False):
         self.session_conf = session_conf
         self.ctx = ctx
         self.session = session
+        self.touch = touch
         self.transaction_manager = session_conf.ctx.get_tx(ctx)
+        self.journal = None
 
     def tpc_finish(self, transaction):
         pass
@@ -225,10 +824,9 @@ class DataManager:
         return 'score.auth(%d)' % (id(self.ctx),)
 
     def tpc_abort(self, transaction):
-        if self.revert_data is not None and self.session.id:
-            self.session.clear()
-            self.session.update(self.revert_data)
-            self.revert_data = None
+        if self.journal is not None and self.session.id:
+            self.session._rollback(self.journal)
+            self.journal = None
 
     def abort(self, transaction):
         self.session.revert()
@@ -237,12 +835,19 @@ class DataManager:
         pass
 
     def commit(self, transaction):
-        if self.session.id:
-            revert_data = {}
-            revert_data.update(self.session)
-            revert_data.pop('id', None)
+        if not self.session.id:
+            return
+        if self.session._is_dirty:
+            # the session replaces its journal when storing, so there is no
+            # need to copy it here
+            journal = self.session._changes
             self.session.store()
-            self.revert_data = revert_data
+            self.journal = journal
+        elif self.touch is not False and self.session._expire is not None:
+            due = self.session._renewal_due(
+                self.session_conf.cookie_refresh or _default_refresh)
+            if due or (due is None and self.touch):
+                self.session._touch()
 
     def tpc_vote(self, transaction):
         pass
@@ -254,11 +859,19 @@ class ConfiguredSessionModule(ConfiguredModule):
     <score.init.ConfiguredModule>`.
     """
 
-    def __init__(self, ctx, ctx_member, cookie_kwargs):
+    def __init__(self, ctx, ctx_member, cookie_kwargs, *,
+                 cookie_refresh=None):
         super().__init__(__package__)
         self.ctx = ctx
         self.ctx_member = ctx_member
         self.cookie_kwargs = cookie_kwargs
+        self.cookie_refresh = cookie_refresh
+        self._unstored_callbacks = []
+        self._observers = []
+        self._write_behind = None
+        self.cache = None
+        self.negative_cache = None
+        self.codec = None
         if ctx and ctx_member:
             self.__register_ctx_member()
         if ctx and cookie_kwargs and 'max_age' in cookie_kwargs:
@@ -272,39 +885,50 @@ class ConfiguredSessionModule(ConfiguredModule):
                     return
                 if not hasattr(ctx, 'http'):
                     return
+                cookie_id, refreshed = self._read_cookie(ctx)
                 ctx_meta = self.ctx.get_meta(ctx)
                 if ctx_meta.member_constructed(ctx_member):
                     session_id = getattr(ctx, ctx_member).id
                 elif hasattr(ctx, id_member):
                     session_id = getattr(ctx, id_member)
-                elif self.cookie_kwargs and hasattr(ctx, 'http'):
-                    session_id = ctx.http.request.cookies.get(
-                        self.cookie_kwargs['name'], None)
                 else:
-                    return
+                    session_id = cookie_id
                 if not session_id:
                     return
+                if session_id == cookie_id and \
+                        not self._refresh_due(refreshed):
+                    return
                 kwargs = self.cookie_kwargs.copy()
-                kwargs['value'] = str(session_id)
+                kwargs['value'] = self._cookie_value(session_id)
                 ctx.http.response.set_cookie(**kwargs)
 
     def __register_ctx_member(self):
         id_member = self.ctx_member + '_id'
 
         def constructor(ctx):
+            touch = False
             if hasattr(ctx, id_member):
                 session = self.load(getattr(ctx, id_member), ctx)
             elif self.cookie_kwargs and hasattr(ctx, 'http'):
-                id = ctx.http.request.cookies.get(
-                    self.cookie_kwargs['name'], None)
+                id, refreshed = self._read_cookie(ctx)
                 session = self.load(id, ctx)
+                # renew the session's expiry whenever we refresh the cookie,
+                # unless the backend knows better. without a refresh policy,
+                # the backend must decide on its own.
+                touch = None
+                if self.cookie_refresh is not None:
+                    touch = self._refresh_due(refreshed)
             else:
                 session = self.create(ctx)
             tx = self.ctx.get_tx(ctx).get()
-            tx.join(DataManager(self, ctx, session))
+            tx.join(DataManager(self, ctx, session, touch=touch))
             return session
 
         def destructor(ctx, session, exception):
+            # persist modifications performed after the transaction was
+            # committed. score.ctx will commit another transaction after
+            # calling all destructors.
+            session.store()
             setattr(ctx, id_member, session.id)
             if self.cookie_kwargs and 'max_age' in self.cookie_kwargs:
                 # the next part is only relevant if we are not setting the
@@ -314,11 +938,166 @@ class ConfiguredSessionModule(ConfiguredModule):
             if self.cookie_kwargs and hasattr(ctx, 'http') and not exception:
                 if session.id and session._original_id != session.id:
                     kwargs = self.cookie_kwargs.copy()
-                    kwargs['value'] = session.id
+                    kwargs['value'] = self._cookie_value(session.id)
                     ctx.http.response.set_cookie(**kwargs)
 
         self.ctx.register(self.ctx_member, constructor, destructor=destructor)
 
+    def _read_cookie(self, ctx):
+        """
+        Returns the session id and the time of the last refresh embedded in
+        the session cookie of the current request. Both values are `None`,
+        if they are not present.
+        """
+        if not self.cookie_kwargs or not hasattr(ctx, 'http'):
+            return None, None
+        value = ctx.http.request.cookies.get(self.cookie_kwargs['name'], None)
+        if not value or self.cookie_refresh is None:
+            return value, None
+        id, sep, refreshed = value.rpartition('.')
+        if not sep:
+            # cookie was set before cookie.refresh was configured
+            return value, None
+        try:
+            return id, int(refreshed, 16)
+        except ValueError:
+            return value, None
+
+    def _cookie_value(self, session_id):
+        if self.cookie_refresh is None:
+            return str(session_id)
+        return '%s.%x' % (session_id, int(time.time()))
+
+    def _refresh_due(self, refreshed):
+        if self.cookie_refresh is None:
+            return True
+        if refreshed is None:
+            return True
+        lifetime = self.cookie_kwargs['max_age']
+        if self.Session._expire is not None:
+            lifetime = min(lifetime, self.Session._expire)
+        age = time.time() - refreshed
+        return age >= self.cookie_refresh * lifetime
+
+    def on_unstored(self, callable):
+        """
+        Registers provided *callable* to be called whenever a
+        :class:`.Session` with unsaved modifications is garbage collected. The
+        callback will receive the session as its sole argument and must not
+        try to store it.
+        """
+        self._unstored_callbacks.append(callable)
+
+    def add_observer(self, observer):
+        """
+        Registers an *observer* for instrumenting session operations. The
+        observer is a callable receiving the name of an event, its duration
+        in seconds, the size of the payload in bytes, if it is known, and the
+        affected :class:`.Session`. The session allows attributing events to
+        the request of its context (available as ``session._ctx``). It is
+        `None` for the kvcache events, which operate on the container
+        directly. The following events are reported:
+
+        - ``validate``: validation of a session id. Backends loading the
+          session data during validation include the time needed for it.
+        - ``load``: loading session data, that was not loaded during
+          validation.
+        - ``copy``: copying (or freezing, if :confkey:`readonly` is enabled)
+          a value read from a session.
+        - ``store``: storing a modified session.
+        - ``kvcache.get``, ``kvcache.set`` and ``kvcache.delete``: operations
+          on kvcache containers. The payload size is only known for entries
+          encoded with a :confkey:`codec`.
+
+        Observers are called synchronously and should be fast. The
+        instrumentation has virtually no overhead, if no observer is
+        registered.
+        """
+        self._observers.append(observer)
+
+    def _report_unstored(self, session):
+        for callback in self._unstored_callbacks:
+            callback(session)
+
+    def collect_garbage(self, chunk_size=1000):
+        """
+        Deletes expired sessions from the backend and returns the number of
+        deleted sessions. The orm backend deletes at most *chunk_size* rows
+        per transaction to keep locks short. This is a no-op for the kvcache
+        backend, which leaves expiry to the cache.
+        """
+        total = 0
+        while True:
+            with self._batch_context() as ctx:
+                count = self.Session._collect_garbage(ctx, chunk_size)
+            total += count
+            if count < chunk_size:
+                return total
+
+    def _batch_context(self):
+        """
+        Returns a new Context for processing a batch of sessions, or a
+        context manager providing `None`, if there is no score.ctx.
+        """
+        if self.ctx:
+            return self.ctx.Context()
+        return contextlib.nullcontext()
+
+    def load_many(self, ids, ctx=None):
+        """
+        Loads the sessions with given *ids* and returns a `dict` mapping
+        each valid id to its :class:`.Session`. Invalid ids are omitted. The
+        orm backend loads the sessions with a single query per 500 ids.
+        """
+        return self.Session._load_many(ctx, list(ids))
+
+    def store_many(self, sessions):
+        """
+        Stores all given *sessions*. Sessions of the orm backend are
+        written when the transaction of their context is committed, which
+        allows the database to process them in a single flush.
+        """
+        for session in sessions:
+            session.store()
+
+    def iter_sessions(self, batch_size=1000):
+        """
+        Generates all existing sessions of the orm backend, ordered by id.
+        Sessions are loaded in batches of *batch_size*, each in a separate
+        Context, whose transaction is committed when the next batch is
+        loaded. Sessions modified during the iteration must be stored
+        explicitly, using :meth:`Session.store` or :meth:`store_many`.
+
+        Only a single batch of sessions is held in memory at a time, which
+        allows processing any number of sessions. Note that the ids of
+        sessions created with an :confkey:`id.secret` are reported in their
+        UUID form.
+
+        The kvcache backend cannot enumerate its sessions and raises
+        `NotImplementedError`.
+        """
+        after = None
+        while True:
+            with self._batch_context() as ctx:
+                batch = self.Session._load_batch(ctx, after, batch_size)
+                try:
+                    yield from batch
+                except GeneratorExit:
+                    # the caller stopped iterating, but the modifications of
+                    # the current batch must still be committed
+                    return
+            if len(batch) < batch_size:
+                return
+            after = batch[-1].id
+
+    def flush(self):
+        """
+        Writes all sessions waiting in the write-behind queue. Does nothing
+        if :confkey:`write_behind` is disabled.
+        """
+        if self._write_behind is not None:
+            self._write_behind.flush()
+
     def create(self, ctx=None):
         """
         Creates a new, empty :class:`.Session`.
@@ -331,33 +1110,124 @@ class ConfiguredSessionModule(ConfiguredModule):
         """
         return self.Session(ctx, id)
 
+    async def async_load(self, id, ctx=None, *, executor=None):
+        """
+        Coroutine variant of :meth:`load`. The session is loaded in the
+        given :mod:`executor <concurrent.futures>` (or the event loop's
+        default executor) along with all its data, which means that reading
+        from the returned session does not block.
+        """
+        def load():
+            session = self.load(id, ctx)
+            session._prefetch()
+            return session
+        return await asyncio.get_running_loop().run_in_executor(executor, load)
+
+    async def async_prepare(self, ctx, *, executor=None):
+        """
+        Constructs the :term:`context member` of given *ctx* in an
+        *executor*, just like :meth:`async_load`. Accessing the session
+        through the context member will not block afterwards.
+        """
+        if not self.ctx_member:
+            raise ValueError('No context member registered')
+
+        def prepare():
+            getattr(ctx, self.ctx_member)._prefetch()
+        await asyncio.get_running_loop().run_in_executor(executor, prepare)
+
 
 class Session(abc.ABC, collections.abc.MutableMapping):
     """
-    A dict-like object managing session data. The modified session information
-    is persisted when this object is destroyed. You can also call
-    :meth:`.store` manually to make the data of this session available to
-    other processes.
+    A dict-like object managing session data. Sessions acquired through a
+    :term:`context member` are persisted when the context's transaction is
+    committed and once more when the context is destroyed. All other sessions
+    must be persisted by calling :meth:`.store` explicitly, or by using the
+    session as a :term:`context manager <python:context manager>`:
+
+    >>> with session_conf.load(session_id) as session:
+    ...     session['parrot'] = 'pining for the fjords'
+    ...
+
+    Sessions are never persisted during garbage collection: a session that is
+    discarded with unsaved modifications is reported to the callbacks
+    registered with :meth:`ConfiguredSessionModule.on_unstored`, instead.
     """
 
+    __slots__ = ('__weakref__', '_ctx', '_was_changed', '_is_dirty',
+                 '_needs_validation', '_changes', 'id', '_original_id')
+
+    _lazy = False
+    _readonly = False
+    _expire = None
+    _ids = None
+    _negative_cache = None
+    _negative_cache_grace = 0
+    _tracks_renewal = False
+
     def __init__(self, ctx, id):
         self._ctx = ctx
         self._was_changed = False
         self._is_dirty = False
-        if not id or not self._id_is_valid(id):
+        self._needs_validation = False
+        # maps each key modified since the last call to store() to its
+        # original value (or _missing, if the key did not exist)
+        self._changes = {}
+        if not id:
+            id = None
+        elif self._ids is not None and not self._ids.check(id):
+            # rejected without contacting the backend
+            id = None
+        elif self._negative_cache is not None and id in self._negative_cache:
+            id = None
+        elif self._lazy:
+            self._needs_validation = True
+        elif not self._check_id(id):
+            self._remember_invalid(id)
             id = None
         self.id = id
         self._original_id = id
 
     def __del__(self):
-        self.store()
+        # do not perform any I/O during garbage collection, just report the
+        # data loss
+        if getattr(self, '_is_dirty', False):
+            self._conf._report_unstored(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if value is None:
+            self.store()
+        else:
+            self.revert()
 
     def store(self):
         """
         Persists the information in this session instance.
         """
         if self._is_dirty:
+            start = time.perf_counter() if self._conf._observers else None
             self._store()
+            self._changes = {}
+            self._is_dirty = False
+            if self._negative_cache is not None:
+                self._negative_cache.discard(self.id)
+            if start is not None:
+                self._notify('store', start, session=self)
+
+    async def async_store(self, *, executor=None):
+        """
+        Coroutine variant of :meth:`store`, which writes the session in the
+        given :mod:`executor <concurrent.futures>`, or the event loop's
+        default executor. Sessions of a :term:`context member`, that were
+        stored this way, will not perform any I/O when the context's
+        transaction is committed.
+        """
+        if self._is_dirty:
+            await asyncio.get_running_loop().run_in_executor(
+                executor, self.store)
 
     def revert(self):
         """
@@ -365,6 +1235,7 @@ class Session(abc.ABC, collections.abc.MutableMapping):
         """
         if self._is_dirty:
             self._revert()
+            self._changes = {}
             self._is_dirty = False
 
     def was_changed(self):
@@ -378,6 +1249,120 @@ class Session(abc.ABC, collections.abc.MutableMapping):
         self._was_changed = True
         self._is_dirty = True
 
+    def _rollback(self, journal):
+        """
+        Restores the original values of all keys in given *journal*, which
+        was taken from ``_changes`` before the session was stored.
+        """
+        for key, value in journal.items():
+            if value is _missing:
+                del self[key]
+            else:
+                self[key] = value
+
+    def _validate(self):
+        """
+        Performs the deferred validation of the session id, if this session
+        was created in lazy mode. This function is called once at the
+        beginning of every public operation accessing the session data.
+        """
+        if not self._needs_validation:
+            return
+        self._needs_validation = False
+        if not self._check_id(self.id):
+            self._remember_invalid(self.id)
+            self.id = None
+            self._original_id = None
+
+    def _check_id(self, id):
+        if not self._conf._observers:
+            return self._id_is_valid(id)
+        start = time.perf_counter()
+        try:
+            return self._id_is_valid(id)
+        finally:
+            self._notify('validate', start, session=self)
+
+    @classmethod
+    def _notify(cls, event, start, size=None, session=None):
+        """
+        Reports an *event* of given *session*, that started at given
+        :func:`time.perf_counter` value, to all observers.
+        """
+        duration = time.perf_counter() - start
+        for observer in cls._conf._observers:
+            observer(event, duration, size, session)
+
+    def _prefetch(self):
+        """
+        Loads all data of this session from the backend, so that subsequent
+        read operations do not block.
+        """
+        self._validate()
+
+    @classmethod
+    def _remember_invalid(cls, id):
+        if cls._negative_cache is None:
+            return
+        # the session might have been created by another process, that did
+        # not store it yet
+        if cls._ids is None:
+            # the age of the id is unknown: it must have been unknown for the
+            # whole grace period
+            cls._negative_cache.add(id, cls._negative_cache_grace)
+        elif cls._ids.age(id) >= cls._negative_cache_grace:
+            cls._negative_cache.add(id)
+
+    @classmethod
+    def _generate_id(cls):
+        if cls._ids is not None:
+            return cls._ids.generate()
+        return str(uuid.uuid4())
+
+    def _touch(self):
+        """
+        Renews the expiry of this unmodified session in the backend.
+        """
+        pass
+
+    def _renewal_due(self, fraction):
+        """
+        Returns whether the given *fraction* of this session's lifetime has
+        passed since its expiry was last renewed, or `None` if the backend
+        does not know. Backends, that know, must set `_tracks_renewal`.
+        """
+        return None
+
+    @classmethod
+    def _collect_garbage(cls, ctx, limit):
+        """
+        Deletes at most *limit* expired sessions and returns the number of
+        deleted sessions.
+        """
+        return 0
+
+    @classmethod
+    def _load_many(cls, ctx, ids):
+        """
+        Returns a `dict` mapping each valid id in *ids* to its session.
+        """
+        sessions = {}
+        for id in ids:
+            session = cls(ctx, id)
+            session._validate()
+            if session.id is not None:
+                sessions[id] = session
+        return sessions
+
+    @classmethod
+    def _load_batch(cls, ctx, after, limit):
+        """
+        Returns a list of at most *limit* sessions with ids greater than
+        *after*, ordered by id.
+        """
+        raise NotImplementedError(
+            'Iterating sessions is not supported by this backend')
+
     # Functions that need to be implemented by sub-classes
 
     @abc.abstractmethod
@@ -416,26 +1401,47 @@ class Session(abc.ABC, collections.abc.MutableMapping):
     # functions above.
 
     def __contains__(self, key):
+        self._validate()
         if self.id is None:
             return False
         return self._contains(key)
 
     def __getitem__(self, key):
+        self._validate()
         if self.id is None:
             raise KeyError(key)
-        return deepcopy(self._get(key))
+        value = self._get(key)
+        if self._conf._observers:
+            start = time.perf_counter()
+            value = freeze(value) if self._readonly else deepcopy(value)
+            self._notify('copy', start, session=self)
+            return value
+        if self._readonly:
+            return freeze(value)
+        return deepcopy(value)
 
     def __setitem__(self, key, value):
-        if self.get(key, self) == value:
-            return
+        self._validate()
+        if self.id is not None and self._contains(key):
+            # compare against the stored value directly, there is no need to
+            # create a copy just for detecting changes
+            current = self._get(key)
+            if current is value or current == value:
+                return
+        else:
+            current = _missing
+        if self._readonly:
+            value = thaw(value)
         if self.id is None:
-            self.id = str(uuid.uuid4())
+            self.id = self._generate_id()
         self._set(key, value)
+        self._changes.setdefault(key, current)
         self._mark_dirty()
 
     def __delitem__(self, key):
         if key not in self:
             return
+        self._changes.setdefault(key, self._get(key))
         self._del(key)
         self._mark_dirty()
 
@@ -448,30 +1454,59 @@ class Session(abc.ABC, collections.abc.MutableMapping):
 
 class DictSession(Session):
 
+    __slots__ = ('_cached_dict', '_was_stored')
+
     def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+        # must be initialized before calling the parent constructor, since
+        # _id_is_valid() may already populate the dict
         self._cached_dict = None
+        self._was_stored = False
+        super().__init__(*args, **kwargs)
+
+    def store(self):
+        was_dirty = self._is_dirty
+        super().store()
+        if was_dirty:
+            self._was_stored = True
 
     @abc.abstractmethod
     def _create_dict(self):
         return {}
 
+    def _prefetch(self):
+        super()._prefetch()
+        if self.id is not None:
+            self._dict
+
     @property
     def _dict(self):
         if self._cached_dict is None:
-            self._cached_dict = self._create_dict()
+            if self._original_id is None and not self._was_stored:
+                # the session did not exist when it was loaded and was never
+                # written since, there is nothing to fetch
+                self._cached_dict = {}
+            elif self._conf._observers:
+                start = time.perf_counter()
+                self._cached_dict = self._create_dict()
+                self._notify('load', start, session=self)
+            else:
+                self._cached_dict = self._create_dict()
         return self._cached_dict
 
     def __iter__(self):
+        self._validate()
         return iter(self._dict)
 
     def items(self):
+        self._validate()
         return self._dict.items()
 
     def keys(self):
+        self._validate()
         return self._dict.keys()
 
     def values(self):
+        self._validate()
         return self._dict.values()
 
     def _contains(self, key):
@@ -491,4 +1526,5 @@ class DictSession(Session):
         return iter(self._dict)
 
     def __len__(self):
+        self._validate()
         return len(self._dict)
@@ -26,32 +26,388 @@
 # the Licensee has his registered seat, an establishment or assets.
 
 
+import collections.abc
+from copy import deepcopy
+import time
+import uuid
+
 from ._init import DictSession
+from ._sharding import ShardedContainer
 import score.kvcache as kvcache
 
 
+def _size(value):
+    # the size is only known for values encoded by a codec
+    if isinstance(value, bytes):
+        return len(value)
+    return None
+
+
 class KvcacheSession(DictSession):
     """
     Session backend that makes use of a configured :mod:`score.kvcache`.
     """
 
-    def _mark_dirty(self):
-        super()._mark_dirty()
-        if self._livedata:
-            self._store()
-            self._is_dirty = False
+    __slots__ = ('_revision', '_fresh')
+
+    _write_behind = None
+    _cache = None
+    _versioned = False
+    _codec = None
+
+    def __init__(self, *args, **kwargs):
+        # the revision of the loaded data, if the payload is versioned
+        self._revision = None
+        self._fresh = False
+        super().__init__(*args, **kwargs)
+
+    @classmethod
+    def _get_entry(cls, key):
+        value = cls._container_get(key)
+        if cls._codec is not None:
+            try:
+                value = cls._codec.decode(value)
+            except ValueError:
+                # e.g. a value stored before the codec was configured
+                cls._conf.log.warning(
+                    'Discarding undecodable session entry %s' % (key,),
+                    exc_info=True)
+                raise kvcache.NotFound(key)
+        return value
+
+    @classmethod
+    def _set_entry(cls, key, value):
+        if cls._codec is not None:
+            value = cls._codec.encode(value)
+        cls._store_entry(key, value)
+
+    @classmethod
+    def _container_get(cls, key):
+        if not cls._conf._observers:
+            return cls._container[key]
+        start = time.perf_counter()
+        value = None
+        try:
+            value = cls._container[key]
+            return value
+        finally:
+            cls._notify('kvcache.get', start, _size(value))
+
+    @classmethod
+    def _store_entry(cls, key, value):
+        start = time.perf_counter() if cls._conf._observers else None
+        cls._container_set(key, value)
+        if start is not None:
+            cls._notify('kvcache.set', start, _size(value))
+
+    @classmethod
+    def _container_set(cls, key, value):
+        if cls._expire is None:
+            cls._container[key] = value
+        elif isinstance(cls._container, ShardedContainer):
+            cls._container.store(key, value, cls._expire)
+        else:
+            # bypass the container to store the entry with our own expiry
+            cls._container.backend.store(
+                cls._container.name, key, value, cls._expire)
+
+    @classmethod
+    def _revision_key(cls, id):
+        return '%s.rev' % (id,)
+
+    @classmethod
+    def _read_revision(cls, id):
+        try:
+            return cls._container_get(cls._revision_key(id))
+        except kvcache.NotFound:
+            return None
+
+    @classmethod
+    def _read_payload(cls, id):
+        """
+        Returns a tuple containing the revision and the payload of the session
+        with given *id*. The revision is `None`, if payloads are not
+        versioned.
+        """
+        payload = cls._get_entry(id)
+        if not cls._versioned:
+            return None, payload
+        if not (isinstance(payload, (tuple, list)) and len(payload) == 2
+                and isinstance(payload[1], dict)):
+            # the payload was stored before versioning was enabled, it is
+            # treated as unversioned until it is stored again
+            return None, payload
+        revision, payload = payload
+        if cls._cache is not None:
+            cls._cache.put(id, revision, deepcopy(payload))
+        return revision, payload
+
+    @classmethod
+    def _write_payload(cls, id, payload):
+        """
+        Writes the *payload* of the session with given *id* and returns its
+        new revision.
+        """
+        if not cls._versioned:
+            cls._set_entry(id, payload)
+            return None
+        # versioned payloads are stored along with their revision, which is
+        # also available as a separate entry for cheap revision checks
+        revision = uuid.uuid4().hex
+        cls._set_entry(id, (revision, payload))
+        cls._store_entry(cls._revision_key(id), revision)
+        if cls._cache is not None:
+            # values handed out by sessions may be modified in place, the
+            # cache must hold its own copy
+            cls._cache.put(id, revision, deepcopy(payload))
+        return revision
+
+    @classmethod
+    def _invalidate(cls, key):
+        start = time.perf_counter() if cls._conf._observers else None
+        try:
+            del cls._container[key]
+        except (kvcache.NotFound, KeyError):
+            # not all kvcache backends raise NotFound on missing keys
+            pass
+        if start is not None:
+            cls._notify('kvcache.delete', start)
+
+    def _fetch(self, id):
+        self._fresh = True
+        if self._write_behind is not None:
+            payload = self._write_behind.get(id)
+            if payload is not None:
+                # the queued payload must not be modified
+                return deepcopy(payload)
+        if self._cache is not None:
+            entry = self._cache.get(id, lambda: self._read_revision(id))
+            if entry is not None:
+                self._revision = entry[0]
+                return deepcopy(entry[1])
+        self._revision, payload = self._read_payload(id)
+        return payload
 
     def _create_dict(self):
+        if self.id is None:
+            return {}
         try:
-            return self._container[self.id]
+            return self._fetch(self.id)
         except kvcache.NotFound:
             return {}
 
     def _id_is_valid(self, id):
-        return id in self._container
+        # fetch the data right away: this validates the id and loads the
+        # session in a single round-trip to the cache
+        try:
+            self._cached_dict = self._fetch(id)
+        except kvcache.NotFound:
+            return False
+        return True
+
+    def _validate(self):
+        self._fresh = False
+        super()._validate()
+        # there is no need to compare the revision, if the data was fetched
+        # during this very call, i.e. by a deferred id validation
+        if self._livedata and self._revision is not None and not self._fresh:
+            if self._read_revision(self.id) != self._revision:
+                self._merge()
+
+    def _merge(self):
+        """
+        Replaces the session data with the data currently stored in the
+        backend and applies all unsaved modifications on top of it.
+        """
+        try:
+            revision, remote = self._read_payload(self.id)
+        except kvcache.NotFound:
+            revision, remote = None, {}
+        local = self._cached_dict
+        for key in self._changes:
+            if key in local:
+                remote[key] = local[key]
+            else:
+                remote.pop(key, None)
+        self._cached_dict = remote
+        self._revision = revision
+        self._fresh = False
 
     def _store(self):
-        self._container[self.id] = self._cached_dict
+        if self._write_behind is not None:
+            # values returned by items() and values() may still be modified in
+            # place, the queued payload must be decoupled from this session
+            self._write_behind.put(self.id, deepcopy(self._cached_dict))
+            return
+        if self._livedata:
+            # compare-and-swap: merge our modifications into the data stored
+            # by other processes, if it changed since we loaded it
+            for _ in range(self._livedata_retries + 1):
+                if self._read_revision(self.id) == self._revision:
+                    break
+                self._merge()
+        self._revision = self._write_payload(self.id, self._cached_dict)
+
+    def _touch(self):
+        # cache entries can only be renewed by writing them again
+        self._validate()
+        if self.id is not None:
+            self._dict  # load the data, if necessary
+            self._store()
 
     def _revert(self):
         self._cached_dict = None
+
+
+class KeyedKvcacheSession(KvcacheSession):
+    """
+    A :class:`KvcacheSession` storing each value in a separate cache entry.
+    The entry of the session id itself contains the list of keys.
+    """
+
+    __slots__ = ('_stored_keys',)
+
+    def __init__(self, *args, **kwargs):
+        self._stored_keys = set()
+        super().__init__(*args, **kwargs)
+
+    def _item_key(self, key):
+        return '%s:%s' % (self.id, key)
+
+    def _load(self, id):
+        keys = self._get_entry(id)
+        self._stored_keys = set(keys)
+        return _LazyValues(self, keys)
+
+    def _create_dict(self):
+        self._stored_keys = set()
+        if self.id is None:
+            return {}
+        try:
+            return self._load(self.id)
+        except kvcache.NotFound:
+            return {}
+
+    def _prefetch(self):
+        super()._prefetch()
+        if self.id is not None:
+            for key in list(self._dict):
+                # loads the value, or removes the key if it vanished
+                self._dict.get(key)
+
+    def _id_is_valid(self, id):
+        try:
+            self._cached_dict = self._load(id)
+        except kvcache.NotFound:
+            return False
+        return True
+
+    def _store(self):
+        data = self._cached_dict
+        if self._expire is not None:
+            # the entries expire individually: all of them must be renewed,
+            # or the index and unmodified values would expire before the
+            # modified ones
+            for key in self._changes:
+                if key not in data:
+                    self._invalidate(self._item_key(key))
+            self._write_all(data)
+            return
+        for key in self._changes:
+            if key in data:
+                self._set_entry(self._item_key(key), data[key])
+                continue
+            self._invalidate(self._item_key(key))
+        keys = set(data)
+        if keys != self._stored_keys:
+            self._set_entry(self.id, list(keys))
+            self._stored_keys = keys
+
+    def _write_all(self, data):
+        for key, value in data.items():
+            self._set_entry(self._item_key(key), value)
+        keys = set(data)
+        self._set_entry(self.id, list(keys))
+        self._stored_keys = keys
+
+    def _touch(self):
+        self._validate()
+        if self.id is None:
+            return
+        self._write_all(self._dict)
+
+
+class _LazyValues(collections.abc.MutableMapping):
+    """
+    The session dict of a :class:`KeyedKvcacheSession`, which fetches values
+    from the cache on first access. Keys, whose entries vanished from the
+    cache although they are still listed in the index, are treated as absent.
+    """
+
+    _unloaded = object()
+    _vanished = object()
+
+    def __init__(self, session, keys):
+        self._session = session
+        self._values = dict.fromkeys(keys, self._unloaded)
+
+    def _resolve(self, key):
+        value = self._values[key]
+        if value is self._unloaded:
+            try:
+                value = self._session._get_entry(
+                    self._session._item_key(key))
+            except kvcache.NotFound:
+                value = self._vanished
+            # replacing the value of an existing key is safe during iteration
+            self._values[key] = value
+        return value
+
+    def __getitem__(self, key):
+        value = self._resolve(key)
+        if value is self._vanished:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._values[key] = value
+
+    def __delitem__(self, key):
+        if self._resolve(key) is self._vanished:
+            raise KeyError(key)
+        del self._values[key]
+
+    def __contains__(self, key):
+        return key in self._values and self._resolve(key) is not self._vanished
+
+    def __iter__(self):
+        for key, value in self._values.items():
+            if value is not self._vanished:
+                yield key
+
+    def __len__(self):
+        return sum(1 for value in self._values.values()
+                   if value is not self._vanished)
+
+    def items(self):
+        return _LazyItemsView(self)
+
+    def values(self):
+        return _LazyValuesView(self)
+
+
+class _LazyItemsView(collections.abc.ItemsView):
+
+    def __iter__(self):
+        mapping = self._mapping
+        for key in mapping._values:
+            value = mapping._resolve(key)
+            if value is not mapping._vanished:
+                yield key, value
+
+
+class _LazyValuesView(collections.abc.ValuesView):
+
+    def __iter__(self):
+        for key, value in self._mapping.items():
+            yield value
@@ -0,0 +1,170 @@
+# Copyright © 2015-2018 STRG.AT GmbH, Vienna, Austria
+# Copyright © 2019-2020 Necdet Can Ateşman <can@atesman.at>, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in
+# the file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district
+# the Licensee has his registered seat, an establishment or assets.
+
+import collections.abc
+from copy import deepcopy
+import datetime
+from decimal import Decimal
+import uuid
+
+
+# values of these types can be handed out as-is
+_immutable_types = (
+    str, bytes, int, float, complex, bool, type(None), Decimal, uuid.UUID,
+    datetime.date, datetime.time, datetime.timedelta,
+)
+
+
+def freeze(value):
+    """
+    Returns a read-only view on given *value* without copying it. Dicts are
+    wrapped in a :class:`FrozenDict`, lists and tuples in a
+    :class:`FrozenList` and sets are converted to `frozenset`. Values of
+    unknown types are deep-copied as a last resort.
+    """
+    if isinstance(value, _immutable_types):
+        return value
+    if isinstance(value, dict):
+        return FrozenDict(value)
+    if isinstance(value, (list, tuple)):
+        return FrozenList(value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    if isinstance(value, (FrozenDict, FrozenList)):
+        return value
+    return deepcopy(value)
+
+
+def thaw(value):
+    """
+    Reverts the effect of :func:`freeze`: returns a mutable deep copy of the
+    data wrapped by a read-only view. Views nested in dicts, lists, tuples and
+    sets are replaced the same way, *value* itself is returned if it does not
+    contain any views.
+    """
+    if isinstance(value, (FrozenDict, FrozenList)):
+        return deepcopy(value._data)
+    if isinstance(value, dict):
+        thawed = {key: thaw(item) for key, item in value.items()}
+        if any(thawed[key] is not item for key, item in value.items()):
+            return thawed
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        thawed = [thaw(item) for item in value]
+        if any(new is not old for new, old in zip(thawed, value)):
+            return type(value)(thawed)
+    return value
+
+
+class FrozenDict(collections.abc.Mapping):
+    """
+    A read-only view on a `dict`. Nested values are wrapped in read-only views
+    themselves when they are accessed. Use :meth:`copy` to retrieve a mutable
+    copy of the data.
+    """
+
+    __slots__ = ('_data',)
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getitem__(self, key):
+        return freeze(self._data[key])
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __eq__(self, other):
+        if isinstance(other, FrozenDict):
+            other = other._data
+        return self._data == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'FrozenDict(%r)' % (self._data,)
+
+    def __deepcopy__(self, memo):
+        return deepcopy(self._data, memo)
+
+    def __reduce__(self):
+        return (dict, (self._data,))
+
+    def copy(self):
+        """
+        Returns a mutable deep copy of the wrapped data.
+        """
+        return deepcopy(self._data)
+
+
+class FrozenList(collections.abc.Sequence):
+    """
+    A read-only view on a `list` or `tuple`, behaving just like
+    :class:`FrozenDict`.
+    """
+
+    __slots__ = ('_data',)
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return FrozenList(self._data[index])
+        return freeze(self._data[index])
+
+    def __len__(self):
+        return len(self._data)
+
+    def __eq__(self, other):
+        if isinstance(other, FrozenList):
+            other = other._data
+        if not isinstance(other, (list, tuple)):
+            return NotImplemented
+        return list(self._data) == list(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'FrozenList(%r)' % (self._data,)
+
+    def __deepcopy__(self, memo):
+        return deepcopy(self._data, memo)
+
+    def __reduce__(self):
+        return (type(self._data), (self._data,))
+
+    def copy(self):
+        """
+        Returns a mutable deep copy of the wrapped data.
+        """
+        return deepcopy(self._data)
@@ -0,0 +1,107 @@
+# Copyright © 2015-2018 STRG.AT GmbH, Vienna, Austria
+# Copyright © 2019-2020 Necdet Can Ateşman <can@atesman.at>, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in
+# the file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district
+# the Licensee has his registered seat, an establishment or assets.
+
+
+import bisect
+import hashlib
+
+import score.kvcache as kvcache
+
+
+def _hash(value):
+    return int.from_bytes(
+        hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class ShardedContainer:
+    """
+    Distributes cache entries across multiple :term:`cache containers
+    <cache container>` using consistent hashing. Each container is placed on
+    a hash ring *vnodes* times, which means that adding a container only
+    moves about ``1/len(containers)`` of all entries.
+
+    All entries of a session are placed in the same container, which is
+    determined by the part of the key preceding the first ``:`` or ``.``.
+    Entries are written to *replicas* distinct containers and read from the
+    first one containing the entry.
+    """
+
+    def __init__(self, containers, replicas=1, vnodes=160):
+        if not 1 <= replicas <= len(containers):
+            raise ValueError('Invalid number of replicas: %d' % replicas)
+        self.containers = list(containers)
+        self.replicas = replicas
+        ring = sorted(
+            (_hash('%s#%d' % (container.name, i)), index)
+            for index, container in enumerate(self.containers)
+            for i in range(vnodes))
+        self._hashes = [point[0] for point in ring]
+        self._indexes = [point[1] for point in ring]
+
+    def _shards(self, key):
+        """
+        Returns the containers responsible for given *key*, starting with
+        the primary one.
+        """
+        id = key.partition(':')[0].partition('.')[0]
+        position = bisect.bisect(self._hashes, _hash(id))
+        shards = []
+        for i in range(len(self._indexes)):
+            index = self._indexes[(position + i) % len(self._indexes)]
+            if index not in shards:
+                shards.append(index)
+                if len(shards) == self.replicas:
+                    break
+        return [self.containers[index] for index in shards]
+
+    def __getitem__(self, key):
+        for container in self._shards(key):
+            try:
+                return container[key]
+            except kvcache.NotFound:
+                # the entry may still be available on a replica, if the
+                # container was added recently
+                continue
+        raise kvcache.NotFound(key)
+
+    def __setitem__(self, key, value):
+        for container in self._shards(key):
+            container[key] = value
+
+    def __delitem__(self, key):
+        for container in self._shards(key):
+            try:
+                del container[key]
+            except (kvcache.NotFound, KeyError):
+                pass
+
+    def store(self, key, value, expire):
+        """
+        Stores given *value* with an explicit *expire* time in seconds.
+        """
+        for container in self._shards(key):
+            container.backend.store(container.name, key, value, expire)
@@ -0,0 +1,153 @@
+# Copyright © 2015-2018 STRG.AT GmbH, Vienna, Austria
+# Copyright © 2019-2020 Necdet Can Ateşman <can@atesman.at>, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in
+# the file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district
+# the Licensee has his registered seat, an establishment or assets.
+
+import atexit
+from collections import OrderedDict
+import threading
+import time
+
+
+class WriteBehindQueue:
+    """
+    A bounded queue of session payloads waiting to be written by a background
+    thread. Multiple writes to the same session id are merged: only the most
+    recent payload of each session is written.
+
+    The given *write* callable receives a session id and the payload to write.
+    The queue is flushed at least every *max_delay* seconds. If the queue
+    contains *max_size* sessions, the thread adding the next session will
+    flush the queue synchronously.
+
+    Failing writes are logged and do not prevent writing the other sessions.
+    The payload of a session is retried during the next *max_retries*
+    flushes and discarded afterwards.
+    """
+
+    def __init__(self, write, max_delay, max_size, *,
+                 flush_on_exit=True, log=None, max_retries=3):
+        self.write = write
+        self.max_delay = max_delay
+        self.max_size = max_size
+        self.max_retries = max_retries
+        self.log = log
+        self._pending = OrderedDict()
+        self._writing = {}
+        # maps ids of sessions, that could not be written, to the number of
+        # failed attempts
+        self._failures = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        if flush_on_exit:
+            atexit.register(self.flush)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def put(self, id, payload):
+        """
+        Schedules writing *payload* for the session with given *id*. Replaces
+        any payload, that is still pending for the same session.
+        """
+        with self._lock:
+            self._pending.pop(id, None)
+            self._pending[id] = payload
+            full = len(self._pending) >= self.max_size
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='score.session.write_behind',
+                    daemon=True)
+                self._thread.start()
+        if full:
+            self.flush()
+
+    def get(self, id):
+        """
+        Returns the payload, that is about to be written for the session with
+        given *id*, or `None` if there is no such payload.
+        """
+        with self._lock:
+            try:
+                return self._pending[id]
+            except KeyError:
+                return self._writing.get(id)
+
+    def flush(self):
+        """
+        Writes all pending payloads synchronously.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                self._writing = self._pending
+                self._pending = OrderedDict()
+            written = set()
+            try:
+                for id, payload in self._writing.items():
+                    if self._write(id, payload):
+                        written.add(id)
+            finally:
+                with self._lock:
+                    # re-queue everything we could not write, unless there
+                    # is a newer payload for the same session already
+                    for id, payload in self._writing.items():
+                        if id not in written and id not in self._pending:
+                            self._pending[id] = payload
+                    self._writing = {}
+
+    def _write(self, id, payload):
+        """
+        Writes a single payload and returns whether it is done with it,
+        i.e. whether it was written or discarded after too many attempts.
+        """
+        try:
+            self.write(id, payload)
+        except Exception:
+            failures = self._failures.get(id, 0) + 1
+            if failures > self.max_retries:
+                self._failures.pop(id, None)
+                if self.log:
+                    self.log.exception(
+                        'Discarding session %s after %d failed writes' %
+                        (id, failures))
+                return True
+            self._failures[id] = failures
+            if self.log:
+                self.log.exception('Could not write session %s' % (id,))
+            return False
+        self._failures.pop(id, None)
+        return True
+
+    def _run(self):
+        while True:
+            time.sleep(self.max_delay)
+            try:
+                self.flush()
+            except Exception:
+                if self.log:
+                    self.log.exception('Could not write sessions')
@@ -25,16 +25,24 @@
 # the discretion of STRG.AT GmbH also the competent court, in whose district
 # the Licensee has his registered seat, an establishment or assets.
 
+from copy import deepcopy
+from datetime import datetime, timedelta
 from itertools import chain
+import json
+import time
 import uuid
 
-from sqlalchemy import Column, exists
-from sqlalchemy.dialects.postgresql import UUID as PSQL_UUID
+from sqlalchemy import Column, DateTime, cast, func, inspect, literal, or_
+from sqlalchemy.dialects.postgresql import (
+    UUID as PSQL_UUID, ARRAY as PSQL_ARRAY, JSONB as PSQL_JSONB, array)
 from sqlalchemy.orm.attributes import flag_modified
-from sqlalchemy.types import TypeDecorator, CHAR, JSON
+from sqlalchemy.types import TypeDecorator, CHAR, JSON, Text
 from zope.sqlalchemy import mark_changed
 
+from ._ids import id_to_uuid
 from ._init import Session
+from ._kvcache import KvcacheSession
+import score.kvcache as kvcache
 
 
 # this class is provided by the official sqlalchemy docs:
@@ -47,6 +55,7 @@ class UUID(TypeDecorator):
 
     """
     impl = CHAR
+    cache_ok = True
 
     def load_dialect_impl(self, dialect):
         if dialect.name == 'postgresql':
@@ -57,7 +66,10 @@ class UUID(TypeDecorator):
     def process_bind_param(self, value, dialect):
         if value is None:
             return value
-        elif dialect.name == 'postgresql':
+        if isinstance(value, str):
+            # ids created with an `id.secret` are stored as their random part
+            value = id_to_uuid(value) or value
+        if dialect.name == 'postgresql':
             return str(value)
         else:
             if not isinstance(value, uuid.UUID):
@@ -78,70 +90,349 @@ class UUID(TypeDecorator):
 class OrmSessionMixin:
     id = Column(UUID, nullable=False, unique=True, primary_key=True)
     data = Column(JSON, nullable=False)
+    expires = Column(DateTime, nullable=True, index=True)
+
+
+# columns of the mixin, that are not exposed as session values
+_internal_columns = ('id', 'data', 'expires')
+
+
+def _not_expired(class_):
+    return or_(class_.expires.is_(None), class_.expires > datetime.utcnow())
+
+
+def _value_columns(class_):
+    return [col.name for col in class_.__table__.columns
+            if col.name not in _internal_columns]
+
+
+def _delete_expired(session_class, ctx, limit):
+    """
+    Deletes at most *limit* expired rows of given orm-backed *session_class*
+    in the transaction of *ctx* and returns the number of deleted rows.
+    """
+    orm = session_class._orm_conf.get_session(ctx)
+    class_ = session_class._orm_class
+    ids = [row[0] for row in orm.query(class_.id).
+           filter(class_.expires <= datetime.utcnow()).
+           limit(limit)]
+    if not ids:
+        return 0
+    orm.query(class_).\
+        filter(class_.id.in_(ids)).\
+        delete(synchronize_session=False)
+    mark_changed(orm, session_class._conf.ctx.get_tx(ctx).get(), True)
+    return len(ids)
 
 
 class OrmSession(Session):
 
+    __slots__ = ('__orm_object',)
+
+    _partial_updates = False
+    _columns = ()
+    _tracks_renewal = True
+
     def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+        # must be initialized before calling the parent constructor, since
+        # _id_is_valid() will already load the orm object
         self.__orm_object = None
+        super().__init__(*args, **kwargs)
+
+    @property
+    def _orm(self):
+        return self._orm_conf.get_session(self._ctx)
 
     def _id_is_valid(self, id):
-        return self._orm.query(exists().where(self._orm_class.id == id)).\
-            scalar()
+        # load the row right away: this validates the id and fetches the
+        # session data with a single query
+        self.__orm_object = self._orm.query(self._orm_class).\
+            filter(self._orm_class.id == id).\
+            filter(_not_expired(self._orm_class)).\
+            first()
+        return self.__orm_object is not None
+
+    @classmethod
+    def _from_orm_object(cls, ctx, obj, id):
+        session = cls(ctx, None)
+        session.__orm_object = obj
+        session.id = id
+        session._original_id = id
+        return session
+
+    @classmethod
+    def _load_many(cls, ctx, ids):
+        orm = cls._orm_conf.get_session(ctx)
+        # maps the stored form of each id to the id itself
+        keys = {}
+        for id in ids:
+            if not id or (cls._ids is not None and not cls._ids.check(id)):
+                continue
+            try:
+                keys[id_to_uuid(id) or uuid.UUID(id)] = id
+            except ValueError:
+                continue
+        sessions = {}
+        keys_list = list(keys)
+        for i in range(0, len(keys_list), 500):
+            query = orm.query(cls._orm_class).\
+                filter(cls._orm_class.id.in_(keys_list[i:i + 500])).\
+                filter(_not_expired(cls._orm_class))
+            for obj in query:
+                id = keys[obj.id]
+                sessions[id] = cls._from_orm_object(ctx, obj, id)
+        return sessions
+
+    @classmethod
+    def _load_batch(cls, ctx, after, limit):
+        # keyset pagination remains fast for late batches and, unlike a
+        # server-side cursor, survives the commit after each batch
+        query = cls._orm_conf.get_session(ctx).query(cls._orm_class).\
+            filter(_not_expired(cls._orm_class))
+        if after is not None:
+            query = query.filter(cls._orm_class.id > after)
+        query = query.order_by(cls._orm_class.id).limit(limit)
+        return [cls._from_orm_object(ctx, obj, str(obj.id)) for obj in query]
+
+    @classmethod
+    def _collect_garbage(cls, ctx, limit):
+        return _delete_expired(cls, ctx, limit)
 
     @property
     def _orm_object(self):
+        self._validate()
         if self.__orm_object is None:
             if self._original_id:
+                start = time.perf_counter() if self._conf._observers else None
                 self.__orm_object = self._orm.query(self._orm_class).\
                     filter(self._orm_class.id == self._original_id).\
                     first()
+                if start is not None:
+                    self._notify('load', start, session=self)
             else:
                 self.__orm_object = self._orm_class(
                     data=dict()
                 )
         return self.__orm_object
 
+    def _prefetch(self):
+        super()._prefetch()
+        self._orm_object
+
     def __delitem__(self, key):
-        if hasattr(self._orm_object, key):
+        if self._is_attribute(key):
             if getattr(self._orm_object, key) is None:
                 return
         return super().__delitem__(key)
 
     def _store(self):
-        self._orm_object.id = self.id
-        self._orm.add(self._orm_object)
-        flag_modified(self._orm_object, 'data')
+        if self._expire is not None:
+            self._orm_object.expires = \
+                datetime.utcnow() + timedelta(seconds=self._expire)
+        if not self._partial_updates or not self._store_partially():
+            self._orm_object.id = self.id
+            self._orm.add(self._orm_object)
+            flag_modified(self._orm_object, 'data')
         mark_changed(self._orm, self._conf.ctx.get_tx(self._ctx).get(), True)
 
+    def _touch(self):
+        self._validate()
+        if self.id is None:
+            return
+        self._orm.query(self._orm_class).\
+            filter(self._orm_class.id == self.id).\
+            update({self._orm_class.expires:
+                    datetime.utcnow() + timedelta(seconds=self._expire)},
+                   synchronize_session=False)
+        mark_changed(self._orm, self._conf.ctx.get_tx(self._ctx).get(), True)
+
+    def _renewal_due(self, fraction):
+        expires = self._orm_object.expires
+        if expires is None:
+            return True
+        remaining = (expires - datetime.utcnow()).total_seconds()
+        return remaining <= self._expire * (1 - fraction)
+
+    def _store_partially(self):
+        """
+        Writes the modified keys of the data column using an UPDATE statement
+        operating on the JSON value in the database. Returns `False` if this is
+        not possible, in which case the whole column must be written.
+        """
+        obj = self._orm_object
+        if self.id != self._original_id or not inspect(obj).persistent:
+            return False
+        updates = {}
+        deletions = []
+        for key in self._changes:
+            if self._is_attribute(key):
+                # regular columns are tracked by sqlalchemy
+                continue
+            if key in obj.data:
+                updates[key] = obj.data[key]
+            else:
+                deletions.append(key)
+        if not updates and not deletions:
+            return True
+        dialect = self._orm.get_bind(self._orm_class).dialect
+        value = _partial_json_update(
+            dialect, self._orm_class.data, updates, deletions)
+        if value is None:
+            return False
+        self._orm.query(self._orm_class).\
+            filter(self._orm_class.id == self.id).\
+            update({self._orm_class.data: value}, synchronize_session=False)
+        return True
+
     def _revert(self):
         # the transaction will be rolled back by score.ctx
         pass
 
+    def _is_attribute(self, key):
+        # the columns of the mixin are not session values: keys with the same
+        # name are stored in the data column like any other value
+        return (key not in _internal_columns
+                and hasattr(self._orm_object, key))
+
     def _set(self, key, value):
-        if hasattr(self._orm_object, key):
+        if self._is_attribute(key):
             setattr(self._orm_object, key, value)
         else:
             self._orm_object.data[key] = value
 
     def _del(self, key):
-        if hasattr(self._orm_object, key):
+        if self._is_attribute(key):
             setattr(self._orm_object, key, None)
         else:
             del(self._orm_object.data[key])
 
     def _contains(self, key):
-        return (hasattr(self._orm_object, key)
+        return (self._is_attribute(key)
                 or key in self._orm_object.data)
 
     def _get(self, key):
-        if hasattr(self._orm_object, key):
+        if self._is_attribute(key):
             return getattr(self._orm_object, key)
         return self._orm_object.data[key]
 
     def _iter(self):
-        return chain((col.name
-                      for col in self._orm_class.__table__.columns
-                      if col.name not in ('id', 'data')),
-                     iter(self._orm_object.data))
+        return chain(self._columns, iter(self._orm_object.data))
+
+
+class TieredSession(KvcacheSession):
+    """
+    A :class:`KvcacheSession` using the table of an :class:`OrmSessionMixin`
+    as persistent storage. Sessions are read from the cache and only loaded
+    from the database on a cache miss, in which case the cache is filled.
+
+    Modified sessions are written to the database along with the cache. If
+    the session class has a write-behind queue, the database rows are
+    written by the queue instead, in separate transactions.
+    """
+
+    __slots__ = ()
+
+    _columns = ()
+
+    @property
+    def _orm(self):
+        return self._orm_conf.get_session(self._ctx)
+
+    def _fetch(self, id):
+        try:
+            return super()._fetch(id)
+        except kvcache.NotFound:
+            pass
+        row = self._orm.query(self._orm_class).\
+            filter(self._orm_class.id == id).\
+            filter(_not_expired(self._orm_class)).\
+            first()
+        if row is None:
+            raise kvcache.NotFound(id)
+        payload = dict(row.data)
+        for name in self._columns:
+            payload[name] = getattr(row, name)
+        self._revision = self._write_payload(id, payload)
+        return dict(payload)
+
+    def _store(self):
+        payload = self._dict
+        self._revision = self._write_payload(self.id, payload)
+        if self._write_behind is not None:
+            self._write_behind.put(self.id, deepcopy(payload))
+            return
+        self._write_row(self._orm, self.id, payload)
+        mark_changed(self._orm, self._conf.ctx.get_tx(self._ctx).get(), True)
+
+    def _rollback(self, journal):
+        # the cache may contain data of the aborted transaction
+        self._invalidate(self.id)
+        if self._cache is not None:
+            self._cache.discard(self.id)
+        super()._rollback(journal)
+
+    @classmethod
+    def _write_row(cls, orm, id, payload):
+        row = orm.get(cls._orm_class, id)
+        if row is None:
+            row = cls._orm_class(id=id)
+            orm.add(row)
+        for name in cls._columns:
+            setattr(row, name, payload.get(name))
+        row.data = {key: value for key, value in payload.items()
+                    if key not in cls._columns}
+        if cls._expire is not None:
+            row.expires = datetime.utcnow() + timedelta(seconds=cls._expire)
+
+    @classmethod
+    def _write_back(cls, id, payload):
+        """
+        Writes the row of a session in a separate transaction. This is the
+        write function of the write-behind queue.
+        """
+        with cls._conf.ctx.Context() as ctx:
+            orm = cls._orm_conf.get_session(ctx)
+            cls._write_row(orm, id, payload)
+            mark_changed(orm, cls._conf.ctx.get_tx(ctx).get(), True)
+
+    @classmethod
+    def _collect_garbage(cls, ctx, limit):
+        return _delete_expired(cls, ctx, limit)
+
+
+def _partial_json_update(dialect, column, updates, deletions):
+    """
+    Creates an SQL expression for the new value of the JSON *column*, after
+    setting the keys in the dict *updates* and removing all keys in
+    *deletions*. Returns `None` if the *dialect* does not support such
+    operations.
+    """
+    keys = list(chain(updates, deletions))
+    if any(not isinstance(key, str) for key in keys):
+        return None
+    if dialect.name == 'postgresql':
+        value = cast(column, PSQL_JSONB)
+        for key, item in updates.items():
+            value = func.jsonb_set(
+                value,
+                cast(array([key]), PSQL_ARRAY(Text)),
+                # bound as text: a JSONB parameter would be serialized again
+                cast(literal(json.dumps(item), Text), PSQL_JSONB))
+        for key in deletions:
+            value = value.op('-')(key)
+        return cast(value, JSON)
+    if dialect.name == 'sqlite':
+        if any('"' in key for key in keys):
+            return None
+        value = column
+        if deletions:
+            value = func.json_remove(
+                value, *('$."%s"' % key for key in deletions))
+        if updates:
+            args = []
+            for key, item in updates.items():
+                args.append('$."%s"' % key)
+                args.append(func.json(json.dumps(item)))
+            value = func.json_set(value, *args)
+        return value
+    return None
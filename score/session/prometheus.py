@@ -0,0 +1,97 @@
+# Copyright © 2015-2018 STRG.AT GmbH, Vienna, Austria
+# Copyright © 2019-2020 Necdet Can Ateşman <can@atesman.at>, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in
+# the file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district
+# the Licensee has his registered seat, an establishment or assets.
+
+
+from prometheus_client import REGISTRY, Gauge, Histogram
+
+
+_duration_buckets = (
+    .00001, .000025, .00005, .0001, .00025, .0005, .001, .0025, .005, .01,
+    .025, .05, .1, .25, .5, 1)
+
+_size_buckets = (
+    64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class PrometheusObserver:
+    """
+    An observer, that registers itself with given *session_conf* and
+    records all events using the prometheus_client_ package. The following
+    metrics are created in the given *registry*:
+
+    - ``<prefix>_duration_seconds``: a histogram of event durations,
+      labelled with the name of the event.
+    - ``<prefix>_payload_bytes``: a histogram of payload sizes, labelled
+      with the name of the event.
+    - ``<prefix>_local_cache_hits`` and ``<prefix>_local_cache_misses``:
+      the counters of the :attr:`cache
+      <score.session.ConfiguredSessionModule.cache>`, if there is one.
+    - ``<prefix>_negative_cache_hits`` and
+      ``<prefix>_negative_cache_misses``: the same counters for the
+      :attr:`negative_cache
+      <score.session.ConfiguredSessionModule.negative_cache>`.
+
+    .. _prometheus_client: https://pypi.org/project/prometheus-client/
+    """
+
+    def __init__(self, session_conf, *, registry=REGISTRY,
+                 prefix='score_session'):
+        self._durations = Histogram(
+            prefix + '_duration_seconds', 'Duration of session operations',
+            ['event'], registry=registry, buckets=_duration_buckets)
+        self._sizes = Histogram(
+            prefix + '_payload_bytes', 'Size of session payloads',
+            ['event'], registry=registry, buckets=_size_buckets)
+        # label lookups are comparably slow, the children are cached here
+        self._children = {}
+        caches = (
+            ('local_cache', session_conf.cache),
+            ('negative_cache', session_conf.negative_cache),
+        )
+        for name, cache in caches:
+            if cache is None:
+                continue
+            for counter in ('hits', 'misses'):
+                gauge = Gauge(
+                    '%s_%s_%s' % (prefix, name, counter),
+                    'Number of %s of the session %s' % (counter, name),
+                    registry=registry)
+                gauge.set_function(
+                    lambda cache=cache, counter=counter:
+                    getattr(cache, counter))
+        session_conf.add_observer(self)
+
+    def __call__(self, event, duration, size, session):
+        try:
+            durations, sizes = self._children[event]
+        except KeyError:
+            durations = self._durations.labels(event)
+            sizes = self._sizes.labels(event)
+            self._children[event] = durations, sizes
+        durations.observe(duration)
+        if size is not None:
+            sizes.observe(size)